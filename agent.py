@@ -1,26 +1,32 @@
-import pygame
-
+import assets
 from direction import Direction
+from physics import agent_hitboxes, agent_size
+from rect import Rect
+
+# Sprite of each hitbox index.
+SPRITES = ('left', 'right', 'still')
 
 
-class Agent(pygame.sprite.Sprite):
+class Agent:
     def __init__(self, x, y, display_width, fps):
-        super().__init__()
         self.laser = None
         self.display_width = display_width
-        self.left_sprite = self.load("Sprites/left.png")
-        self.still_sprite = self.load("Sprites/still.png")
-        self.right_sprite = self.load("Sprites/right.png")
-        self.image = self.still_sprite
-        self.rect = self.image.get_rect()
+        # Name of the current sprite; images and masks are loaded on first use.
+        self.sprite = 'still'
+        self.hitboxes = agent_hitboxes(display_width)
+        self.hitbox_index = 2
+        self.rect = Rect(0, 0, *agent_size(display_width))
         self.rect.midbottom = (x, y)
         self.speed = display_width / fps / 5.13
         self.direction = Direction.STILL
 
-    def load(self, filename):
-        image = pygame.image.load(filename)
-        # if display width = 720, player height = 47 and width = 21
-        return pygame.transform.scale(image, (30 / 720 * self.display_width, 47 / 720 * self.display_width))
+    @property
+    def image(self):
+        return assets.agent_sprite(self.sprite, self.display_width)
+
+    @property
+    def mask(self):
+        return assets.agent_mask(self.sprite, self.display_width)
 
     def step(self, direction):
         if not isinstance(direction, Direction):
@@ -40,11 +46,24 @@ class Agent(pygame.sprite.Sprite):
 
     def update_image(self, direction):
         if direction == Direction.LEFT:
-            self.image = self.left_sprite
+            self.sprite = 'left'
+            self.hitbox_index = 0
         elif direction == Direction.RIGHT:
-            self.image = self.right_sprite
+            self.sprite = 'right'
+            self.hitbox_index = 1
         elif direction == Direction.STILL or direction == Direction.SHOOT:
-            self.image = self.still_sprite
+            self.sprite = 'still'
+            self.hitbox_index = 2
+
+    def hitbox(self):
+        """
+        Opaque bounds of the current sprite, used by the geometric collision
+        modes.
+
+        :return: A tuple (left, top, width, height) in screen coordinates.
+        """
+        left, top, width, height = (values[self.hitbox_index] for values in self.hitboxes)
+        return self.rect.x + left, self.rect.y + top, width, height
 
     def draw(self, window):
-        window.blit(self.image, self.rect)
+        window.blit(self.image, (self.rect.x, self.rect.y))
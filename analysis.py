@@ -1,22 +1,15 @@
-import os
-
 import matplotlib.pyplot as plt
 
-best_reward = []
-idx = []
-path = "Results/ppo_1D_v2"
-files = os.listdir(path)
-with open(path + "/rewards.txt", 'r') as f:
-    for i, r in enumerate(f.read().split(",")):
-        if i % 1000 == 0:
-            continue
+from metrics_store import MetricsStore
 
-        episode = i + 1
-        suffix = '0' * (6-len(str(episode))) + str(episode)
-        if os.path.exists(path+"/checkpoint-" + suffix):
-            best_reward.append(r)
-            idx.append(episode)
+path = "Results/ppo_1D_v2"
+store = MetricsStore(path)
+store.import_rewards_txt()
+# Mean reward of every checkpoint but the periodic ones.
+checkpoints = store.checkpoints()
+best = checkpoints.filter(checkpoints.column('best'))
+idx = best.column('iteration').to_pylist()
+best_reward = best.column('episode_reward_mean').to_pylist()
 
 plt.plot(idx, best_reward)
 plt.show()
-
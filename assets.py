@@ -0,0 +1,68 @@
+"""
+Process-wide cache of the images, collision masks and text the game draws.
+
+Everything is loaded on first use and shared by every game in the process
+(and by workers forked after it was loaded), so a game that never renders
+and uses a geometric collision mode never imports pygame. Cached objects
+must not be modified.
+"""
+import os
+
+_CACHE = {}
+
+SPRITES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Sprites")
+AGENT_SPRITES = {
+    'left': os.path.join(SPRITES_DIR, "left.png"),
+    'still': os.path.join(SPRITES_DIR, "still.png"),
+    'right': os.path.join(SPRITES_DIR, "right.png"),
+}
+
+
+def _cached(key, load):
+    value = _CACHE.get(key)
+    if value is None:
+        value = _CACHE[key] = load()
+
+    return value
+
+
+def agent_sprite(name, display_width):
+    """The agent's 'left', 'still' or 'right' sprite, scaled to the display."""
+    def load():
+        import pygame
+        image = pygame.image.load(AGENT_SPRITES[name])
+        # if display width = 720, player height = 47 and width = 21
+        return pygame.transform.scale(image, (30 / 720 * display_width, 47 / 720 * display_width))
+
+    return _cached(('agent_sprite', name, display_width), load)
+
+
+def agent_mask(name, display_width):
+    """Collision mask of one of the agent's sprites."""
+    def load():
+        import pygame
+        return pygame.mask.from_surface(agent_sprite(name, display_width))
+
+    return _cached(('agent_mask', name, display_width), load)
+
+
+def ball_mask(level, radius, resolution):
+    """Collision mask of a ball, sized to its bounding box."""
+    def load():
+        import pygame
+        surface = pygame.Surface((2 * radius, 2 * radius), pygame.SRCALPHA)
+        pygame.draw.circle(surface, (255, 255, 255), (radius, radius), radius)
+        return pygame.mask.from_surface(surface)
+
+    return _cached(('ball_mask', level, radius, resolution), load)
+
+
+def text(message, color, background, size=32):
+    """A line of text rendered in the default font."""
+    def load():
+        import pygame
+        pygame.font.init()
+        font = _cached(('font', size), lambda: pygame.font.Font('freesansbold.ttf', size))
+        return font.render(message, True, color, background)
+
+    return _cached(('text', message, color, background, size), load)
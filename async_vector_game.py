@@ -0,0 +1,200 @@
+import ctypes
+import multiprocessing as mp
+import traceback
+
+import gymnasium as gym
+import numpy as np
+
+from games import GAMES
+
+
+def _shared(ctx, shape, dtype):
+    """A zeroed array in process-shared memory, with the buffer behind it."""
+    raw = ctx.RawArray(ctypes.c_uint8, max(_nbytes(shape, dtype), 1))
+    return raw, _view(raw, shape, dtype)
+
+
+def _view(raw, shape, dtype):
+    """The array of a buffer from _shared."""
+    data = np.frombuffer(raw, dtype=np.uint8)[:_nbytes(shape, dtype)]
+    return data.view(dtype).reshape(shape)
+
+
+def _nbytes(shape, dtype):
+    return int(np.prod(shape)) * np.dtype(dtype).itemsize
+
+
+class AsyncVectorGame(gym.vector.VectorEnv):
+    """
+    Copies of Game, Game2D or Game2DFlat stepped in a pool of worker
+    processes, each running envs_per_process environments one after the
+    other.
+
+    Actions, observations, rewards and dones are exchanged through arrays in
+    shared memory that every worker writes its own rows of, so a step only
+    sends a short command down each worker's pipe. Environments that
+    terminate or are truncated are reset automatically, as in VectorGame;
+    the observation they ended on is returned in info["final_observation"].
+    """
+
+    def __init__(self, config):
+        """
+        :param config: Dict with the keys
+                       - game: 'Game', 'Game2D' or 'Game2DFlat';
+                       - env_config: config of every environment (render_mode
+                         defaults to None and copy_obs to False);
+                       - num_envs, envs_per_process: number of environments,
+                         and how many each worker process runs;
+                       - start_method: multiprocessing start method (the
+                         platform's default if not given).
+        """
+        self.name = "Async"
+        game = config.get('game', 'Game')
+        if game not in GAMES:
+            raise ValueError(f"Unknown game: {game}")
+
+        self.env_config = dict(config.get('env_config', {}))
+        self.env_config.setdefault('render_mode', None)
+        # Observations are copied into shared memory anyway.
+        self.env_config.setdefault('copy_obs', False)
+        envs_per_process = config.get('envs_per_process', 1)
+        if envs_per_process < 1:
+            raise ValueError("envs_per_process must be at least 1.")
+
+        # A local copy only gives the spaces.
+        env = GAMES[game](self.env_config)
+        observation_space, action_space = env.observation_space, env.action_space
+        env.close()
+        super().__init__(config.get('num_envs', 8), observation_space, action_space)
+
+        n = self.num_envs
+        shape = observation_space.shape
+        ctx = mp.get_context(config.get('start_method'))
+        buffers = {
+            'observations': ((n,) + shape, observation_space.dtype),
+            'final_observations': ((n,) + shape, observation_space.dtype),
+            'actions': ((n,), np.int64),
+            'rewards': ((n,), np.float64),
+            'terminated': ((n,), bool),
+            'truncated': ((n,), bool),
+        }
+        raws = {}
+        for name, (buffer_shape, dtype) in buffers.items():
+            raws[name], array = _shared(ctx, buffer_shape, dtype)
+            setattr(self, name, array)
+
+        self.pipes = []
+        self.processes = []
+        for start in range(0, n, envs_per_process):
+            rows = (start, min(start + envs_per_process, n))
+            parent, child = ctx.Pipe()
+            process = ctx.Process(target=_worker, name=f"AsyncVectorGame-{start}", daemon=True,
+                                  args=(child, parent, game, self.env_config, rows, raws, buffers))
+            process.start()
+            child.close()
+            self.pipes.append(parent)
+            self.processes.append(process)
+
+        self._waiting = None
+
+    def reset_async(self, seed=None, options=None):
+        """
+        :param seed: An int seeding environment i with seed + i, or a list
+                     of one seed per environment.
+        """
+        self._assert_idle()
+        if seed is None or isinstance(seed, int):
+            seeds = [None if seed is None else seed + i for i in range(self.num_envs)]
+        else:
+            seeds = list(seed)
+            if len(seeds) != self.num_envs:
+                raise ValueError(f"Expected {self.num_envs} seeds, got {len(seeds)}.")
+
+        self._send('reset', seeds, options)
+
+    def reset_wait(self, seed=None, options=None):
+        self._receive('reset')
+        return self.observations.copy(), {}
+
+    def step_async(self, actions):
+        self._assert_idle()
+        self.actions[:] = actions
+        self._send('step', None, None)
+
+    def step_wait(self):
+        self._receive('step')
+        infos = {}
+        done = self.terminated | self.truncated
+        if done.any():
+            infos['final_observation'] = self.final_observations.copy()
+            infos['_final_observation'] = done
+
+        return (self.observations.copy(), self.rewards.copy(), self.terminated.copy(),
+                self.truncated.copy(), infos)
+
+    def close_extras(self, **kwargs):
+        if self._waiting is not None:
+            self._receive(self._waiting)
+
+        for pipe in self.pipes:
+            pipe.send(('close', None, None))
+        for process in self.processes:
+            process.join()
+        for pipe in self.pipes:
+            pipe.close()
+
+    def _assert_idle(self):
+        if self._waiting is not None:
+            raise RuntimeError(f"Still waiting for a pending call to {self._waiting}.")
+
+    def _send(self, command, seeds, options):
+        for pipe in self.pipes:
+            pipe.send((command, seeds, options))
+        self._waiting = command
+
+    def _receive(self, command):
+        if self._waiting != command:
+            raise RuntimeError(f"{command}_wait called without a pending {command}_async.")
+
+        errors = [message for ok, message in (pipe.recv() for pipe in self.pipes) if not ok]
+        self._waiting = None
+        if errors:
+            raise RuntimeError("A worker failed:\n" + errors[0])
+
+
+def _worker(pipe, parent, game, env_config, rows, raws, buffers):
+    """Run the environments of rows [start, stop) until told to close."""
+    parent.close()
+    start, stop = rows
+    arrays = {name: _view(raws[name], shape, dtype)[start:stop]
+              for name, (shape, dtype) in buffers.items()}
+    observations, final_observations = arrays['observations'], arrays['final_observations']
+    rewards, terminated, truncated = arrays['rewards'], arrays['terminated'], arrays['truncated']
+    actions = arrays['actions']
+    envs = []
+    while True:
+        command, seeds, options = pipe.recv()
+        try:
+            if command == 'close':
+                for env in envs:
+                    env.close()
+                break
+
+            if not envs:
+                envs = [GAMES[game](env_config) for _ in range(stop - start)]
+
+            if command == 'reset':
+                for i, env in enumerate(envs):
+                    observations[i] = env.reset(seed=seeds[start + i], options=options)[0]
+            elif command == 'step':
+                for i, env in enumerate(envs):
+                    observation, rewards[i], terminated[i], truncated[i], _ = env.step(int(actions[i]))
+                    if terminated[i] or truncated[i]:
+                        final_observations[i] = observation
+                        observation = env.reset()[0]
+                    observations[i] = observation
+            pipe.send((True, None))
+        except Exception:
+            pipe.send((False, traceback.format_exc()))
+
+    pipe.close()
@@ -32,54 +32,56 @@ calculate_vertical_motion(height_example, time_between_peaks_example)
 
 
 class BallLevel1(AbstractBall):
-    def load_properties(self, display_height, display_width):
+    level = 1
+
+    @classmethod
+    def load_properties(cls, display_height, display_width):
         radius = round(5 / 550 * display_width)
         bounce_height = round(48 / 290 * display_height)
         bounce_time = 1.13
         yacc, max_speed = calculate_vertical_motion(bounce_height, bounce_time)
         return radius, max_speed, yacc
 
-    def pop(self):
-        self.kill()
-
 
 class BallLevel2(AbstractBall):
-    def load_properties(self, display_height, display_width):
+    level = 2
+    child_color = YELLOW
+
+    @classmethod
+    def load_properties(cls, display_height, display_width):
         radius = round(9 / 550 * display_width)
         bounce_height = round(102 / 290 * display_height)
         bounce_time = 1.61
         yacc, max_speed = calculate_vertical_motion(bounce_height, bounce_time)
         return radius, max_speed, yacc
 
-    def pop(self):
-        self.kill()
-        return (BallLevel1(self.rect.x, self.rect.y, self.display_width, self.display_height, YELLOW, self.fps, False),
-                BallLevel1(self.rect.x, self.rect.y, self.display_width, self.display_height, YELLOW, self.fps, True))
-
 
 class BallLevel3(AbstractBall):
-    def load_properties(self, display_height, display_width):
+    level = 3
+    child_color = BLUE
+
+    @classmethod
+    def load_properties(cls, display_height, display_width):
         radius = round(17 / 550 * display_width)
         bounce_height = round(125 / 290 * display_height)
         bounce_time = 1.78
         yacc, max_speed = calculate_vertical_motion(bounce_height, bounce_time)
         return radius, max_speed, yacc
 
-    def pop(self):
-        self.kill()
-        return (BallLevel2(self.rect.x, self.rect.y, self.display_width, self.display_height, BLUE, self.fps, False),
-                BallLevel2(self.rect.x, self.rect.y, self.display_width, self.display_height, BLUE, self.fps, True))
-
 
 class BallLevel4(AbstractBall):
-    def load_properties(self, display_height, display_width):
+    level = 4
+    child_color = GREEN
+
+    @classmethod
+    def load_properties(cls, display_height, display_width):
         radius = round(25 / 550 * display_width)
         bounce_height = round(149 / 290 * display_height)
         bounce_time = 1.96
         yacc, max_speed = calculate_vertical_motion(bounce_height, bounce_time)
         return radius, max_speed, yacc
 
-    def pop(self):
-        self.kill()
-        return (BallLevel3(self.rect.x, self.rect.y, self.display_width, self.display_height, GREEN, self.fps, False),
-                BallLevel3(self.rect.x, self.rect.y, self.display_width, self.display_height, GREEN, self.fps, True))
+
+# Ball classes indexed by their level; index 0 is unused so that a ball's
+# level can be used directly as an index into per-class tables.
+BALL_CLASSES = (None, BallLevel1, BallLevel2, BallLevel3, BallLevel4)
@@ -0,0 +1,369 @@
+import numpy as np
+
+from assets import ball_mask
+from ball import BALL_CLASSES
+from physics import AGENT_COLLISIONS, ball_tables, ball_xspeed, laser_collides
+from trajectory import step_balls, trajectories
+
+# Name, dtype and trailing shape of every per-ball column.
+COLUMNS = (
+    ('active', bool, ()),
+    ('level', np.int8, ()),
+    ('order', np.int64, ()),
+    ('x', float, ()),
+    ('y', float, ()),
+    ('rect_x', float, ()),
+    ('rect_y', float, ()),
+    ('xspeed', float, ()),
+    ('yspeed', float, ()),
+    ('radius', float, ()),
+    ('timestep', float, ()),
+    ('color', np.uint8, (3,)),
+    # Trajectory table and segment state (see trajectory.py): the float
+    # position at the ball's last event and the number of frames since.
+    ('table', np.int16, ()),
+    ('x0', float, ()),
+    ('x_phase', np.int64, ()),
+    ('y0', float, ()),
+    ('y_phase', np.int64, ()),
+    ('bounced', bool, ()),
+)
+
+
+class BallStore:
+    """
+    Every ball of a game, stored as NumPy columns with one slot per ball.
+
+    Popped balls hand their slot back to a free list that new and split
+    balls are placed in, so stepping a level allocates no objects. Balls are
+    updated all at once, and are iterated in the order they were added, like
+    the sprite Group they replace.
+
+    Collisions are found by sort and sweep: the balls in play are kept
+    sorted by rect x, and the laser and the agent, which both span a narrow
+    x-interval, are only tested against the balls a binary search finds
+    overlapping it.
+    """
+
+    def __init__(self, width, height, capacity=32):
+        self.width = width
+        self.height = height
+        self.radius_table = ball_tables(width, height)[0]
+        self.xspeed_table = ball_xspeed(width)
+        self.trajectories = trajectories(width, height)
+        self._masks = None
+        # Slots of the balls in play sorted by rect x, their rect x and the
+        # largest diameter among them, valid while _swept is set.
+        self._sweep_slots = np.zeros(0, dtype=np.int64)
+        self._sweep_x = np.zeros(0)
+        self._max_diameter = 0.0
+        self._swept = False
+        self.capacity = 0
+        self.next_order = 0
+        self.free = []
+        for name, dtype, shape in COLUMNS:
+            setattr(self, name, np.zeros((0,) + shape, dtype=dtype))
+
+        self._grow(capacity)
+
+    @property
+    def masks(self):
+        """Collision masks of the balls, indexed by level. Loaded on first use."""
+        if self._masks is None:
+            self._masks = [ball_mask(level, int(radius), (self.width, self.height)) if cls else None
+                           for level, (cls, radius) in enumerate(zip(BALL_CLASSES, self.radius_table))]
+
+        return self._masks
+
+    def __len__(self):
+        return self.capacity - len(self.free)
+
+    def __iter__(self):
+        return iter(self.slots())
+
+    def slots(self):
+        """Slots of the balls in play, in the order they were added."""
+        slots = np.flatnonzero(self.active)
+        return slots[np.argsort(self.order[slots], kind='stable')]
+
+    def clear(self):
+        self._swept = False
+        self.active[:] = False
+        self.xspeed[:] = 0.0
+        self.yspeed[:] = 0.0
+        self.free = list(range(self.capacity - 1, -1, -1))
+        self.next_order = 0
+
+    def add(self, cls, x, y, color, fps=36, right=True):
+        """
+        Add a ball of the given class, as constructing it used to.
+
+        :return: The ball's slot.
+        """
+        return self._add(cls.level, x, y, color, 1.0 / fps, right)
+
+    def load(self, level, x, y, color, timestep):
+        """
+        Replace every ball with the given ones, all moving right, as clear()
+        followed by add() for each ball would, but with one copy per column.
+
+        :param level: Int array of ball levels, in the order they are added.
+        """
+        count = len(level)
+        self.clear()
+        if count > self.capacity:
+            self._grow(count)
+
+        self.free = list(range(self.capacity - 1, count - 1, -1))
+        self.next_order = count
+        new = slice(0, count)
+        self.active[new] = True
+        self.level[new] = level
+        self.order[new] = np.arange(count)
+        self.x[new] = x
+        self.y[new] = y
+        # pygame.Rect truncates the coordinates it is constructed with.
+        self.rect_x[new] = np.trunc(x)
+        self.rect_y[new] = np.trunc(y)
+        self.xspeed[new] = self.xspeed_table
+        self.yspeed[new] = 0.0
+        self.radius[new] = self.radius_table[level]
+        self.timestep[new] = timestep
+        self.color[new] = color
+        self.table[new] = self.trajectories.lookup(level, self.timestep[new])
+        self.x0[new] = x
+        self.x_phase[new] = 0
+        self.y0[new] = y
+        self.y_phase[new] = 0
+        self.bounced[new] = False
+
+    def _add(self, level, x, y, color, timestep, right):
+        if not self.free:
+            self._grow(max(self.capacity * 2, 1))
+
+        self._swept = False
+        slot = self.free.pop()
+        self.active[slot] = True
+        self.level[slot] = level
+        self.order[slot] = self.next_order
+        self.next_order += 1
+        self.x[slot] = x
+        self.y[slot] = y
+        # pygame.Rect truncates the coordinates it is constructed with.
+        self.rect_x[slot] = int(x)
+        self.rect_y[slot] = int(y)
+        self.xspeed[slot] = self.xspeed_table * (1 if right else -1)
+        self.yspeed[slot] = 0.0
+        self.radius[slot] = self.radius_table[level]
+        self.timestep[slot] = timestep
+        self.color[slot] = color
+        self.table[slot] = self.trajectories.id(level, timestep)
+        self.x0[slot] = x
+        self.x_phase[slot] = 0
+        self.y0[slot] = y
+        self.y_phase[slot] = 0
+        self.bounced[slot] = False
+        return slot
+
+    def _grow(self, capacity):
+        old = self.capacity
+        for name, dtype, shape in COLUMNS:
+            column = np.zeros((capacity,) + shape, dtype=dtype)
+            column[:old] = getattr(self, name)
+            setattr(self, name, column)
+
+        self.free = list(range(capacity - 1, old - 1, -1)) + self.free
+        self.capacity = capacity
+
+    def _release(self, slot):
+        self._swept = False
+        self.active[slot] = False
+        self.xspeed[slot] = 0.0
+        self.yspeed[slot] = 0.0
+        self.free.append(slot)
+
+    def pop(self, slot):
+        """
+        Remove a ball. Balls above level 1 split into two balls of the level
+        below, placed at the popped ball's rect and moving apart.
+
+        :return: The slots of the two new balls, or None if it did not split.
+        """
+        self._release(slot)
+        level = self.level[slot]
+        if level == 1:
+            return None
+
+        color = BALL_CLASSES[level].child_color
+        x, y, timestep = self.rect_x[slot], self.rect_y[slot], self.timestep[slot]
+        return (self._add(level - 1, x, y, color, timestep, False),
+                self._add(level - 1, x, y, color, timestep, True))
+
+    def update(self):
+        """
+        Move every ball by one frame. Balls reaching the ceiling are removed
+        without splitting.
+        """
+        self._swept = False
+        was_active = self.active.copy()
+        step_balls(self.trajectories, self.active, self.table, self.x0, self.x_phase,
+                   self.y0, self.y_phase, self.bounced, self.x, self.y, self.rect_x,
+                   self.rect_y, self.xspeed, self.yspeed, self.radius, self.width, self.height)
+        for slot in np.flatnonzero(was_active & ~self.active):
+            self._release(slot)
+
+    def laser_hit(self, laser):
+        """
+        Slot of the first ball the laser overlaps (in order), or None. A laser
+        only ever pops one ball, since it is deactivated by the hit.
+        """
+        if not laser.active:
+            return None
+
+        # The laser overlaps balls whose rect spans its x.
+        slots = self._overlapping(laser.x, laser.x, closed=True)
+        if len(slots) == 0:
+            return None
+
+        radius = self.radius[slots]
+        hits = laser_collides(laser.active, laser.x, laser.length, True,
+                              self.rect_x[slots] + radius, self.rect_y[slots] + radius,
+                              radius, self.height)
+        slots = slots[hits]
+        if len(slots) == 0:
+            return None
+
+        return slots[np.argmin(self.order[slots])]
+
+    def agent_hits(self, agent, exclude=None, collision='mask'):
+        """
+        Number of balls touching the agent, not counting the ball in slot
+        exclude.
+
+        :param collision: 'mask' to test the balls' circles against the
+                          agent's sprite pixels (as pygame's collide_mask), or
+                          one of physics.AGENT_COLLISIONS ('rect', 'capsule')
+                          to test them against a geometric agent hitbox.
+        """
+        if collision != 'mask':
+            return self._hitbox_hits(agent, exclude, AGENT_COLLISIONS[collision])
+
+        # Only balls whose bounding box overlaps the agent's rect are tested
+        # pixel by pixel.
+        rect = agent.rect
+        candidates = self._overlapping(rect.left, rect.right)
+        candidates = candidates[(self.rect_y[candidates] < rect.bottom)
+                                & (self.rect_y[candidates] + 2 * self.radius[candidates] > rect.top)]
+        if len(candidates) == 0:
+            return 0
+
+        count = 0
+        for slot in candidates:
+            if slot == exclude:
+                continue
+
+            offset = (int(self.rect_x[slot]) - rect.x, int(self.rect_y[slot]) - rect.y)
+            if agent.mask.overlap(self.masks[self.level[slot]], offset):
+                count += 1
+
+        return count
+
+    def _hitbox_hits(self, agent, exclude, collides):
+        left, top, width, height = agent.hitbox()
+        # Broad phase: only balls overlapping the hitbox's x-interval.
+        slots = self._overlapping(left, left + width)
+        if exclude is not None:
+            slots = slots[slots != exclude]
+        if len(slots) == 0:
+            return 0
+
+        radius = self.radius[slots]
+        return int(np.count_nonzero(collides(left, top, width, height, True,
+                                             self.rect_x[slots] + radius,
+                                             self.rect_y[slots] + radius, radius)))
+
+    def _overlapping(self, left, right, closed=False):
+        """
+        Slots of the balls in play whose rect's x-extent overlaps the open
+        interval (left, right), or the closed one [left, right] if closed is
+        set, in x order.
+        """
+        self._sweep()
+        x = self._sweep_x
+        # Rects starting within a diameter before left, up to right.
+        start = np.searchsorted(x, left - self._max_diameter, side='left' if closed else 'right')
+        stop = np.searchsorted(x, right, side='right' if closed else 'left')
+        slots = self._sweep_slots[start:stop]
+        end = self.rect_x[slots] + 2 * self.radius[slots]
+        return slots[end >= left] if closed else slots[end > left]
+
+    def _sweep(self):
+        """
+        Sort the balls in play by rect x, once per frame at most. Sorting
+        starts from the previous order, which balls only move a few pixels
+        from in a frame, so the stable sort (a merge sort that runs through
+        presorted runs) is close to linear.
+        """
+        if self._swept:
+            return
+
+        slots = self._sweep_slots[self.active[self._sweep_slots]]
+        listed = np.zeros(self.capacity, dtype=bool)
+        listed[slots] = True
+        slots = np.concatenate((slots, np.flatnonzero(self.active & ~listed)))
+        x = self.rect_x[slots]
+        order = np.argsort(x, kind='stable')
+        self._sweep_slots = slots[order]
+        self._sweep_x = x[order]
+        self._max_diameter = 2 * self.radius[slots].max() if len(slots) else 0.0
+        self._swept = True
+
+    def get_state(self):
+        """
+        Every column, the free list and the insertion counter, as one flat
+        uint8 buffer for set_state.
+        """
+        header = np.array([self.capacity, self.next_order, len(self.free)], dtype=np.int64)
+        free = np.zeros(self.capacity, dtype=np.int64)
+        free[:len(self.free)] = self.free
+        return np.concatenate([header.view(np.uint8)]
+                              + [getattr(self, name).reshape(-1).view(np.uint8) for name, _, _ in COLUMNS]
+                              + [free.view(np.uint8)])
+
+    def set_state(self, state):
+        """
+        Restore a buffer from get_state, copying it column by column.
+
+        :param state: A uint8 array starting with the buffer.
+        :return: The number of bytes read.
+        """
+        capacity, next_order, free = state[:24].view(np.int64)
+        if capacity != self.capacity:
+            for name, dtype, shape in COLUMNS:
+                setattr(self, name, np.zeros((capacity,) + shape, dtype=dtype))
+            self.capacity = int(capacity)
+
+        self._sweep_slots = np.zeros(0, dtype=np.int64)
+        self._swept = False
+        offset = 24
+        for name, _, _ in COLUMNS:
+            column = getattr(self, name).reshape(-1).view(np.uint8)
+            column[:] = state[offset:offset + len(column)]
+            offset += len(column)
+
+        self.free = state[offset:offset + 8 * free].view(np.int64).tolist()
+        self.next_order = int(next_order)
+        # Table ids are only meaningful within a process.
+        self.table[:] = self.trajectories.lookup(self.level, self.timestep)
+        return offset + 8 * self.capacity
+
+    def draw(self, window):
+        import pygame
+        for slot in self.slots():
+            radius = int(self.radius[slot])
+            center = (int(self.rect_x[slot]) + radius, int(self.rect_y[slot]) + radius)
+            pygame.draw.circle(window, self.color[slot], center, radius)
+
+    def __repr__(self):
+        return "[" + ", ".join(f"({self.x[slot]}, {self.y[slot]}), {self.radius[slot]})"
+                               for slot in self.slots()) + "]"
@@ -0,0 +1,187 @@
+"""
+Benchmark the environment's hot paths: Game.step, Game.reset,
+Laser._will_collide, Game._get_obs, Game._render_frame (rgb_array) and the
+lookback updates of Game2D and Game2DFlat.
+
+Every benchmark is swept over ball layouts (a random level, the fixed level
+7 and synthetic stress layouts of many balls), fps and display widths, and
+reports calls per second and latency percentiles. Games that end during a
+benchmark are restored to their starting state outside the timings.
+
+    python benchmark.py --fps 24 60 --widths 720 1440 --stress 100 400 --out bench.json
+"""
+import argparse
+import json
+import platform
+import random
+import time
+
+import numpy as np
+
+from game import Game
+from game_lookback import Game2D
+from game_lookback_flat import Game2DFlat
+from levels import COLORS
+
+PERCENTILES = (50, 90, 99)
+
+
+def timings(call, calls, restore=None):
+    """
+    Time calls to call(i) one by one.
+
+    :param restore: Called (untimed) after every call returning True, to
+                    put the game back into a state the benchmark can go on
+                    from.
+    :return: Int array of the latency of every call, in nanoseconds.
+    """
+    ns = np.empty(calls, dtype=np.int64)
+    for i in range(calls):
+        start = time.perf_counter_ns()
+        ended = call(i)
+        ns[i] = time.perf_counter_ns() - start
+        if restore is not None and ended:
+            restore()
+
+    return ns
+
+
+def summary(ns):
+    """Calls per second and latency statistics, in microseconds."""
+    us = ns / 1000
+    report = {
+        'calls': len(ns),
+        'calls_per_sec': float(1e6 / us.mean()),
+        'mean_us': float(us.mean()),
+        'max_us': float(us.max()),
+    }
+    for q, value in zip(PERCENTILES, np.percentile(us, PERCENTILES)):
+        report[f'p{q}_us'] = float(value)
+
+    return report
+
+
+def load_layout(game, layout, seed):
+    """
+    Load a layout into a reset game: 'random', 'level7' or 'stressN', N
+    random balls spread over the display (as random levels place them).
+    """
+    if layout == 'random':
+        game.reset(seed=seed)
+    elif layout == 'level7':
+        game.reset(seed=seed, options={'level': 7})
+    elif layout.startswith('stress'):
+        game.reset(seed=seed)
+        count = int(layout[len('stress'):])
+        rng = np.random.default_rng(seed)
+        game.balls.load(rng.integers(1, 5, size=count).astype(np.int8),
+                        rng.integers(0, game.width + 1, size=count).astype(float),
+                        rng.integers(0, game.height - 200 + 1, size=count).astype(float),
+                        np.array(COLORS, dtype=np.uint8)[rng.integers(0, len(COLORS), size=count)],
+                        np.full(count, 1.0 / 36))
+        game._restore_obs()
+    else:
+        raise ValueError(f"Unknown layout: {layout}")
+
+
+def bench_layout(config, layout, calls, seed):
+    """Benchmarks that depend on the balls in play, for one layout."""
+    report = {}
+    game = Game(config)
+    load_layout(game, layout, seed)
+    state = game.get_state()
+    report['balls'] = len(game.balls)
+
+    def restore():
+        game.set_state(state)
+
+    actions = random.Random(seed)
+
+    def step(_):
+        _, _, terminated, truncated, _ = game.step(actions.randrange(4))
+        return terminated or truncated
+
+    report['step'] = summary(timings(step, calls, restore))
+    restore()
+    laser = game.agent.laser
+    report['will_collide'] = summary(timings(
+        lambda _: laser._will_collide(game.balls, game.agent.rect.centerx), calls))
+    report['get_obs'] = summary(timings(lambda _: game._get_obs(), calls))
+
+    pixels = Game(dict(config, obs_type='pixels'))
+    load_layout(pixels, layout, seed)
+    report['get_obs_pixels'] = summary(timings(lambda _: pixels._get_obs(), calls))
+
+    rendered = Game(dict(config, render_mode='rgb_array'))
+    load_layout(rendered, layout, seed)
+    report['render_frame'] = summary(timings(lambda _: rendered._render_frame(), max(calls // 10, 1)))
+
+    for cls in (Game2D, Game2DFlat):
+        lookback = cls(config)
+        load_layout(lookback, layout, seed)
+        report[f'{cls.__name__}_update_obs'] = summary(timings(lambda _: lookback._update_obs(), calls))
+
+    return report
+
+
+def bench_reset(config, calls):
+    game = Game(config)
+    return summary(timings(lambda i: game.reset(seed=i), calls))
+
+
+def run(widths, fps_values, layouts, calls, collision, seed):
+    """
+    :return: A list of results, one per (width, fps) pair, each with a
+             'reset' benchmark and one set of benchmarks per layout.
+    """
+    results = []
+    for width in widths:
+        for fps in fps_values:
+            config = {'render_mode': None, 'width': width, 'fps': fps, 'collision': collision}
+            result = {'width': width, 'fps': fps, 'reset': bench_reset(config, calls), 'layouts': {}}
+            for layout in layouts:
+                result['layouts'][layout] = bench_layout(config, layout, calls, seed)
+            results.append(result)
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('--widths', type=int, nargs='+', default=[720])
+    parser.add_argument('--fps', type=int, nargs='+', default=[24, 60])
+    parser.add_argument('--stress', type=int, nargs='*', default=[100, 400],
+                        help="Ball counts of the synthetic stress layouts.")
+    parser.add_argument('--calls', type=int, default=1000, help="Timed calls per benchmark.")
+    parser.add_argument('--collision', default='mask')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help="Write the results to this JSON file.")
+    args = parser.parse_args()
+
+    layouts = ['random', 'level7'] + [f'stress{count}' for count in args.stress]
+    results = run(args.widths, args.fps, layouts, args.calls, args.collision, args.seed)
+    for result in results:
+        print(f"width {result['width']}, fps {result['fps']}: "
+              f"reset {result['reset']['mean_us']:.1f} us")
+        for layout, benchmarks in result['layouts'].items():
+            print(f"  {layout} ({benchmarks['balls']} balls)")
+            for name, stats in benchmarks.items():
+                if name == 'balls':
+                    continue
+                print(f"    {name:22} {stats['calls_per_sec']:10.0f}/s  "
+                      f"p50 {stats['p50_us']:8.1f} us  p99 {stats['p99_us']:8.1f} us")
+
+    if args.out:
+        report = {
+            'args': vars(args),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'platform': platform.platform(),
+            'results': results,
+        }
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""
+Checkpoints published on a background thread, so training carries on while
+they are renamed into place and old ones deleted.
+
+RLlib algorithms are not thread-safe, so a checkpoint is saved (with
+Algorithm.save, in RLlib's own format) on the training thread, into
+<run>/.staging/. The writer's thread then renames it into place, so a run's
+directory only ever holds whole checkpoints, and deletes every checkpoint of
+the run that is neither among the keep_best best ones (by mean reward) nor
+among the keep_last latest. Checkpoints already in the run's directory when
+the writer starts (from before a resume) count towards both.
+"""
+import collections
+import math
+import os
+import shutil
+import threading
+import traceback
+
+from metrics_store import CHECKPOINT_DIR
+
+
+def checkpoint_name(iteration):
+    return f"checkpoint-{iteration:06d}"
+
+
+def report_checkpoints(written, save_path):
+    """:return: The path of the latest best checkpoint written, or save_path."""
+    for iteration, path, reward, best in written:
+        if best:
+            save_path = path
+            print(f"\nCkpt saved: {path}")
+            print(f"Mean reward : {round(reward,4)}")
+        else:
+            print(f"\nCkpt (not best) saved: {path}")
+
+    return save_path
+
+
+def _reward(value):
+    return -math.inf if value is None or math.isnan(value) else value
+
+
+class CheckpointWriter:
+
+    def __init__(self, directory, keep_best=5, keep_last=3, store=None):
+        """
+        :param directory: The run's results directory, checkpoints are
+                          written into.
+        :param keep_best: Number of best checkpoints kept.
+        :param keep_last: Number of latest checkpoints kept.
+        :param store: The run's MetricsStore, whose checkpoint index gives
+                      the rewards of the checkpoints already in directory.
+                      Those it does not index are only kept as latest ones.
+        """
+        if keep_best < 1 or keep_last < 1:
+            raise ValueError("keep_best and keep_last must be at least 1.")
+
+        self.directory = directory
+        self.staging = os.path.join(directory, ".staging")
+        self.keep_best = keep_best
+        self.keep_last = keep_last
+        # Checkpoints on disk, as (iteration, path, reward, best) tuples, and
+        # those not collected by written() yet.
+        self.kept = self._existing(store)
+        self.done = []
+        self.pending = collections.deque()
+        self.writing = False
+        self.closed = False
+        self.error = None
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._run, name="CheckpointWriter", daemon=True)
+        self.thread.start()
+
+    def save(self, iteration, reward, save, best=True):
+        """
+        Save a checkpoint with save(path), on the calling thread, and have it
+        published on the writer's.
+
+        :param reward: The iteration's mean reward.
+        :param best: False for checkpoints saved periodically rather than for
+                     a new best mean reward.
+        """
+        self._raise()
+        staged = os.path.join(self.staging, checkpoint_name(iteration))
+        shutil.rmtree(staged, ignore_errors=True)
+        os.makedirs(staged)
+        save(staged)
+        with self.condition:
+            self.pending.append((iteration, staged, reward, best))
+            self.condition.notify()
+
+    def written(self):
+        """
+        :return: The checkpoints published since the last call, as
+                 (iteration, path, reward, best) tuples, to be indexed (e.g.
+                 with MetricsStore.add_checkpoint) on the training thread.
+        """
+        with self.condition:
+            self._raise()
+            done, self.done = self.done, []
+        return done
+
+    def index(self, store):
+        """
+        Index the checkpoints published since the last call in a MetricsStore.
+
+        :return: The checkpoints indexed, as from written().
+        """
+        done = self.written()
+        for iteration, path, reward, best in done:
+            store.add_checkpoint(iteration, path, reward, best)
+        return done
+
+    def wait(self):
+        """Block until every checkpoint saved is published."""
+        with self.condition:
+            while (self.pending or self.writing) and self.error is None:
+                self.condition.wait()
+            self._raise()
+
+    def close(self):
+        """Publish the checkpoints saved and stop the writer."""
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+        self.thread.join()
+        with self.condition:
+            self._raise()
+
+    def _raise(self):
+        if self.error is not None:
+            raise RuntimeError(f"Writing a checkpoint failed:\n{self.error}")
+
+    def _existing(self, store):
+        rows = store.checkpoints().to_pylist() if store is not None else []
+        indexed = {os.path.normpath(row['path']): row for row in rows}
+        kept = []
+        for name in sorted(os.listdir(self.directory)):
+            match = CHECKPOINT_DIR.match(name)
+            path = os.path.join(self.directory, name)
+            if not match or not os.path.isdir(path):
+                continue
+            row = indexed.get(os.path.normpath(path))
+            if row is None:
+                kept.append((int(match.group(1)), path, None, False))
+            else:
+                kept.append((int(match.group(1)), path, row['episode_reward_mean'], row['best']))
+
+        return kept
+
+    def _run(self):
+        while True:
+            with self.condition:
+                while not self.pending and not self.closed:
+                    self.condition.wait()
+                if not self.pending:
+                    return
+                request = self.pending.popleft()
+                self.writing = True
+
+            try:
+                entry = self._publish(*request)
+            except Exception:
+                with self.condition:
+                    self.error = traceback.format_exc()
+                    self.writing = False
+                    self.condition.notify_all()
+                return
+
+            with self.condition:
+                self.done.append(entry)
+                self.writing = False
+                self.condition.notify_all()
+
+    def _publish(self, iteration, staged, reward, best):
+        path = os.path.join(self.directory, checkpoint_name(iteration))
+        # A checkpoint of the same iteration (from before a resume) is
+        # replaced.
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(staged, path)
+
+        self.kept = [entry for entry in self.kept if entry[1] != path]
+        entry = (iteration, path, reward, best)
+        self.kept.append(entry)
+        self._prune()
+        return entry
+
+    def _prune(self):
+        best = sorted((entry for entry in self.kept if entry[3]), key=lambda entry: -_reward(entry[2]))
+        latest = sorted(self.kept, key=lambda entry: -entry[0])
+        keep = {entry[1] for entry in best[:self.keep_best] + latest[:self.keep_last]}
+        for entry in self.kept:
+            if entry[1] not in keep:
+                shutil.rmtree(entry[1], ignore_errors=True)
+        self.kept = [entry for entry in self.kept if entry[1] in keep]
@@ -0,0 +1,111 @@
+"""
+Measure how closely the geometric collision modes ('rect', 'capsule') agree
+with pixel-mask collisions, on states recorded from random play.
+
+Every step, each ball whose bounding box overlaps the agent's rect is tested
+with every mode (balls further away never collide in any mode). Mismatches
+are reported per ball pair and per step, i.e. whether the step would have
+ended the game.
+
+    python collision_calibration.py --episodes 200 --fps 60 --width 720
+"""
+import argparse
+import json
+import random
+
+import numpy as np
+
+from game import Game
+from physics import AGENT_COLLISIONS
+
+
+def near_contacts(game):
+    """
+    Collision results of every ball near the agent, one row per ball, with
+    columns in the order ('mask',) + tuple(AGENT_COLLISIONS).
+    """
+    agent, balls = game.agent, game.balls
+    rect = agent.rect
+    rows = []
+    for slot in balls.slots():
+        radius = balls.radius[slot]
+        x, y = int(balls.rect_x[slot]), int(balls.rect_y[slot])
+        if (x >= rect.right or x + 2 * radius <= rect.left
+                or y >= rect.bottom or y + 2 * radius <= rect.top):
+            continue
+
+        row = [agent.mask.overlap(balls.masks[balls.level[slot]], (x - rect.x, y - rect.y)) is not None]
+        for collides in AGENT_COLLISIONS.values():
+            row.append(bool(collides(*agent.hitbox(), True, x + radius, y + radius, radius)))
+
+        rows.append(row)
+
+    return rows
+
+
+def record(episodes, fps, width, seed):
+    """
+    Play random episodes with mask collisions and record near contacts.
+
+    :return: A tuple (pairs, steps) of boolean arrays, with one row per ball
+             near the agent and one row per step with any ball near it.
+    """
+    rng = random.Random(seed)
+    game = Game({'render_mode': None, 'fps': fps, 'width': width})
+    pairs, steps = [], []
+    for _ in range(episodes):
+        game.reset(seed=rng.randrange(2**31))
+        terminated = False
+        while not terminated:
+            _, _, terminated, _, _ = game.step(rng.randrange(4))
+            rows = near_contacts(game)
+            if rows:
+                pairs.extend(rows)
+                steps.append(np.any(rows, axis=0))
+
+    shape = (-1, 1 + len(AGENT_COLLISIONS))
+    return np.array(pairs, dtype=bool).reshape(shape), np.array(steps, dtype=bool).reshape(shape)
+
+
+def agreement(results):
+    """Agreement of each geometric mode with the mask column of results."""
+    mask = results[:, 0]
+    report = {}
+    for i, mode in enumerate(AGENT_COLLISIONS, start=1):
+        geometric = results[:, i]
+        report[mode] = {
+            'samples': len(mask),
+            'agreement': float(np.mean(geometric == mask)) if len(mask) else 1.0,
+            'false_positives': int(np.count_nonzero(geometric & ~mask)),
+            'false_negatives': int(np.count_nonzero(~geometric & mask)),
+            'mask_collisions': int(np.count_nonzero(mask)),
+        }
+
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('--episodes', type=int, default=100)
+    parser.add_argument('--fps', type=int, default=60)
+    parser.add_argument('--width', type=int, default=720)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', help="Write the report to this JSON file.")
+    args = parser.parse_args()
+
+    pairs, steps = record(args.episodes, args.fps, args.width, args.seed)
+    report = {'ball_pairs': agreement(pairs), 'steps': agreement(steps)}
+    for level, modes in report.items():
+        print(f"{level}:")
+        for mode, stats in modes.items():
+            print(f"  {mode:8} agreement {stats['agreement']:.4f}  "
+                  f"false +{stats['false_positives']} -{stats['false_negatives']}  "
+                  f"of {stats['samples']} ({stats['mask_collisions']} mask collisions)")
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
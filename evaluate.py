@@ -0,0 +1,164 @@
+"""
+Evaluate a policy on a fixed, seeded suite of headless episodes: every fixed
+level (Levels.get(1..7)) then --random levels from the random bank, episode
+i being reset with seed --seed + i. Episodes are spread over --workers
+processes; a checkpoint is loaded once, by an InferenceServer that batches
+the workers' observations.
+
+Reports the return, episode length, levels cleared and the total of every
+reward term, both raw (counts of events such as game_over, which may weigh
+nothing) and weighted, as means with 95% confidence intervals over the
+whole suite, the fixed levels and the random ones. A checkpoint's results
+are written next to it in its Results/<name>_v<N>/ directory.
+
+    python evaluate.py --checkpoint Results/ppo_1D_v5/checkpoint-007412 --random 64
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import time
+
+import numpy as np
+
+from game import EVENT_TERMS, SHAPING_TERMS
+from games import GAMES
+from inference_server import InferenceServer
+from policies import make_policy, play, play_clients
+
+# Two-sided 95% normal quantile.
+Z_95 = 1.959964
+
+
+def episode_suite(fixed_levels, random_levels, seed=0):
+    """
+    :return: The suite's episodes, as (seed, level) pairs with level 0 for a
+             random level.
+    """
+    levels = list(range(1, fixed_levels + 1)) + [0] * random_levels
+    return [(seed + i, level) for i, level in enumerate(levels)]
+
+
+def evaluation_config(env_config):
+    """An env config for evaluation: headless, logging every reward term."""
+    return dict(env_config, render_mode=None, log_rewards=list(SHAPING_TERMS + EVENT_TERMS),
+                record_dir=None)
+
+
+def _play_policy(task):
+    game_name, env_config, policy_name, episodes, max_steps = task
+    game = GAMES[game_name](env_config)
+    summaries = play(lambda seed: make_policy(policy_name, seed=seed), game, episodes, max_steps)
+    game.close()
+    return summaries
+
+
+def confidence_interval(values):
+    """
+    :return: A dict with the mean of values, and the half-width of its 95%
+             confidence interval (normal approximation).
+    """
+    values = np.asarray(values, dtype=float)
+    if len(values) == 0:
+        return {'mean': float('nan'), 'ci95': float('nan')}
+
+    spread = values.std(ddof=1) / np.sqrt(len(values)) if len(values) > 1 else 0.0
+    return {'mean': float(values.mean()), 'ci95': float(Z_95 * spread)}
+
+
+def summarize(summaries):
+    """Confidence intervals of every metric over a list of episode summaries."""
+    report = {'episodes': len(summaries)}
+    for metric in ('return', 'length', 'cleared', 'died'):
+        report[metric] = confidence_interval([summary[metric] for summary in summaries])
+    names = summaries[0]['terms'] if summaries else ()
+    for part in ('raw', 'terms'):
+        report[part] = {name: confidence_interval([summary[part][name] for summary in summaries])
+                        for name in names}
+    return report
+
+
+def evaluate(game, env_config, policy, checkpoint=None, random_levels=32, seed=0, workers=1,
+             max_steps=10000, latency_ms=2.0):
+    """
+    Play the evaluation suite in worker processes.
+
+    :param policy: 'random', 'scripted', 'expert' or 'checkpoint'.
+    :return: A dict with the episodes' summaries and their reports.
+    """
+    env_config = evaluation_config(env_config)
+    env = GAMES[game](env_config)
+    fixed_levels = len(env.levels.fixed)
+    observation_space = env.observation_space
+    env.close()
+    episodes = episode_suite(fixed_levels, random_levels, seed)
+    workers = max(min(workers, len(episodes)), 1)
+
+    start = time.perf_counter()
+    if policy == 'checkpoint':
+        if not checkpoint:
+            raise ValueError("The checkpoint policy needs a checkpoint.")
+        server = InferenceServer(checkpoint, observation_space, workers, latency_ms=latency_ms).start()
+        summaries = play_clients(server, game, env_config, episodes, max_steps)
+        server.close()
+    else:
+        with mp.Pool(workers) as pool:
+            tasks = [(game, env_config, policy, episodes[i::workers], max_steps) for i in range(workers)]
+            summaries = [summary for share in pool.map(_play_policy, tasks) for summary in share]
+    elapsed = time.perf_counter() - start
+
+    summaries.sort(key=lambda summary: summary['seed'])
+    return {
+        'settings': {'game': game, 'env_config': env_config, 'policy': policy,
+                     'checkpoint': checkpoint, 'random_levels': random_levels, 'seed': seed,
+                     'max_steps': max_steps},
+        'seconds': elapsed,
+        'all': summarize(summaries),
+        'fixed': summarize([summary for summary in summaries if summary['level']]),
+        'random': summarize([summary for summary in summaries if not summary['level']]),
+        'episodes': summaries,
+    }
+
+
+def results_file(checkpoint):
+    """Where a checkpoint's evaluation is written: next to it, in its run's directory."""
+    checkpoint = os.path.normpath(checkpoint)
+    return os.path.join(os.path.dirname(checkpoint), f"evaluation-{os.path.basename(checkpoint)}.json")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('--checkpoint', help="Checkpoint to evaluate (implies --policy checkpoint).")
+    parser.add_argument('--policy', choices=['random', 'scripted', 'expert', 'checkpoint'])
+    parser.add_argument('--game', default='Game', choices=sorted(GAMES))
+    parser.add_argument('--env-config', default='{}', help="Env config, as JSON.")
+    parser.add_argument('--random', type=int, default=32, help="Number of random levels.")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--max-steps', type=int, default=10000)
+    parser.add_argument('--latency-ms', type=float, default=2.0)
+    parser.add_argument('--out', help="JSON file of the results (default: next to the checkpoint).")
+    args = parser.parse_args()
+
+    policy = args.policy or ('checkpoint' if args.checkpoint else 'expert')
+    results = evaluate(args.game, json.loads(args.env_config), policy, args.checkpoint, args.random,
+                       args.seed, args.workers, args.max_steps, args.latency_ms)
+    print(f"{results['all']['episodes']} episodes in {results['seconds']:.1f}s")
+    for part in ('all', 'fixed', 'random'):
+        report = results[part]
+        print(f"{part:>6}: " + ", ".join(f"{metric} {report[metric]['mean']:.3f} ± {report[metric]['ci95']:.3f}"
+                                          for metric in ('return', 'length', 'cleared')))
+    for name, term in results['all']['terms'].items():
+        raw = results['all']['raw'][name]
+        print(f"  {name:>12}: {term['mean']:.3f} ± {term['ci95']:.3f} "
+              f"(raw {raw['mean']:.3f} ± {raw['ci95']:.3f})")
+
+    out = args.out or (results_file(args.checkpoint) if policy == 'checkpoint' else None)
+    if out:
+        with open(out, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
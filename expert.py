@@ -0,0 +1,167 @@
+"""
+A scripted expert playing Game and VectorGame, evaluated for a whole batch
+of environments at once with the kernels of physics.py and trajectory.py.
+
+Every ball's rect is looked up over the laser's lifetime, as step_balls will
+produce it, and each environment's agent:
+
+- fires, if its laser is idle and would hit a ball fired now;
+- otherwise moves under the ball whose path reaches its column first (or the
+  nearest ball, if none does within the lifetime);
+- falls back on whichever of left, right or still keeps it clear of every
+  ball the longest, if the action it chose would touch one within `margin`
+  frames (holding that action).
+
+Actions are chosen from the environments' states rather than their
+observations, which do not hold the balls' trajectory segments.
+"""
+import numpy as np
+
+from physics import (AGENT_COLLISIONS, agent_hitboxes, agent_size, agent_speed, laser_collides,
+                     round_half_away)
+from trajectory import first_true, trajectories, x_paths, y_paths
+
+LEFT, RIGHT, SHOOT, STILL = range(4)
+
+
+class Expert:
+
+    def __init__(self, width, height, fps, collision='rect', margin=None):
+        """
+        :param collision: Agent-vs-ball test ('rect' or 'capsule', see
+                          physics.AGENT_COLLISIONS). Mask collisions are
+                          predicted with the rect test.
+        :param margin: Frames of predicted contact avoided, a quarter of a
+                       second by default.
+        """
+        self.width = width
+        self.height = height
+        self.trajectories = trajectories(width, height)
+        self.agent_collides = AGENT_COLLISIONS.get(collision, AGENT_COLLISIONS['rect'])
+        self.agent_width, self.agent_height = agent_size(width)
+        self.agent_y = height - self.agent_height
+        self.hitbox_x, self.hitbox_y, self.hitbox_width, self.hitbox_height = agent_hitboxes(width)
+        self.speed = agent_speed(width, fps)
+        self.laser_speed = height / fps
+        self.margin = max(fps // 4, 1) if margin is None else margin
+        # Frames until a laser fired now tops out.
+        self.frames = int(np.ceil((height - self.agent_height) / self.laser_speed)) + 1
+
+    def actions(self, agent_x, laser_active, ball_active, table, x0, x_phase, y0, y_phase,
+                bounced, xspeed, radius):
+        """
+        :param agent_x: The agents' rect x, with shape (n,).
+        :param laser_active: Whether each agent's laser is active, shape (n,).
+        :param ball_active: Ball columns as in BallStore and VectorGame, each
+                            with shape (n, capacity).
+        :return: An int array of actions, with shape (n,).
+        """
+        n = len(agent_x)
+        frames = self.frames
+        actions = np.full(n, STILL)
+        # Only the balls in play are solved for, each against its env's agent.
+        envs, slots = np.nonzero(ball_active)
+        if len(envs) == 0:
+            return actions
+
+        center_x, center_y, in_play = self._paths(table[envs, slots], x0[envs, slots],
+                                                  x_phase[envs, slots], y0[envs, slots],
+                                                  y_phase[envs, slots], bounced[envs, slots],
+                                                  xspeed[envs, slots], radius[envs, slots])
+        radius = radius[envs, slots, None]
+        agent_x = np.asarray(agent_x, dtype=float)
+        agent_center = agent_x + self.agent_width // 2
+
+        # A laser fired now from the agent's center, frame by frame.
+        lengths = np.minimum(self.agent_height + self.laser_speed * np.arange(1, frames + 1),
+                             self.height)
+        alive = np.ones(frames, dtype=bool)
+        alive[1:] = lengths[:-1] < self.height
+        hits = laser_collides(alive, agent_center[envs, None], lengths, in_play, center_x,
+                              center_y, radius, self.height)
+        fire = ~laser_active & (np.bincount(envs, hits.any(axis=1), minlength=n) > 0)
+
+        # The ball reaching the agent's column first or, if none does, the
+        # nearest one: balls are ranked by the frame they reach it on, then
+        # by their distance from it.
+        column = ((center_x >= agent_x[envs, None])
+                  & (center_x <= agent_x[envs, None] + self.agent_width) & in_play)
+        crossing = first_true(column)
+        distance = np.abs(center_x[:, 0] - agent_center[envs])
+        ranked = np.lexsort((distance, crossing, envs))
+        first = ranked[np.searchsorted(envs[ranked], np.unique(envs))]
+        targets = np.zeros(n, dtype=int)
+        targets[envs[first]] = first
+        when = np.minimum(crossing[targets], frames - 1)
+        offset = center_x[targets, when] - agent_center
+        chosen = np.where(np.abs(offset) <= self.speed, STILL, np.where(offset < 0, LEFT, RIGHT))
+        chosen = np.where(fire, SHOOT, chosen)
+        playing = np.bincount(envs, minlength=n) > 0
+        actions[playing] = chosen[playing]
+
+        # Frame of first contact holding each action, by action.
+        contact = np.full((n, 4), frames)
+        for action in (LEFT, RIGHT, STILL):
+            x = self._agent_paths(agent_x, action)[envs]
+            touching = self.agent_collides(x + self.hitbox_x[action], self.agent_y + self.hitbox_y[action],
+                                           self.hitbox_width[action], self.hitbox_height[action],
+                                           in_play, center_x, center_y, radius)
+            np.minimum.at(contact[:, action], envs, first_true(touching))
+        contact[:, SHOOT] = contact[:, STILL]
+
+        escape = np.array([LEFT, RIGHT, STILL])[np.argmax(contact[:, [LEFT, RIGHT, STILL]], axis=1)]
+        danger = contact[np.arange(n), actions] < self.margin
+        return np.where(danger, escape, actions)
+
+    def game_actions(self, games):
+        """Actions for a list of Games (of this expert's display size)."""
+        capacity = max(game.balls.capacity for game in games)
+        columns = {}
+        for name in ('active', 'table', 'x0', 'x_phase', 'y0', 'y_phase', 'bounced', 'xspeed', 'radius'):
+            dtype = getattr(games[0].balls, name).dtype
+            columns[name] = np.zeros((len(games), capacity), dtype=dtype)
+            for i, game in enumerate(games):
+                columns[name][i, :game.balls.capacity] = getattr(game.balls, name)
+
+        agent_x = np.array([game.agent.rect.x for game in games], dtype=float)
+        laser_active = np.array([game.agent.laser.active for game in games])
+        return self.actions(agent_x, laser_active, columns['active'], columns['table'],
+                            columns['x0'], columns['x_phase'], columns['y0'], columns['y_phase'],
+                            columns['bounced'], columns['xspeed'], columns['radius'])
+
+    def vector_actions(self, env):
+        """Actions for every environment of a VectorGame."""
+        return self.actions(env.agent_x, env.laser_active, env.active, env.table, env.x0,
+                            env.x_phase, env.y0, env.y_phase, env.bounced, env.ball_xspeed,
+                            env.radius)
+
+    def _paths(self, table, x0, x_phase, y0, y_phase, bounced, xspeed, radius):
+        """
+        Centers of the given balls over the next frames, with shape (balls,
+        frames), and whether each is still in play on every frame.
+        """
+        diameter = 2 * radius
+        rect_x = x_paths(self.trajectories, table, x0, x_phase, xspeed, diameter,
+                         self.width, self.frames)[0]
+        rect_y, _, _, _, ceiling = y_paths(self.trajectories, table, y0, y_phase, bounced,
+                                           diameter, self.height, self.frames)
+        in_play = np.arange(self.frames) < ceiling[:, None]
+        return rect_x + radius[:, None], rect_y + radius[:, None], in_play
+
+    def _agent_paths(self, agent_x, action):
+        """
+        Rect x of the agents over the next frames, holding an action: after
+        the first move rounds x, the agent moves by a constant, rounded step
+        until it reaches a wall.
+        """
+        x = np.asarray(agent_x, dtype=float)
+        if action not in (LEFT, RIGHT):
+            return np.repeat(x[:, None], self.frames, axis=1)
+
+        speed = -self.speed if action == LEFT else self.speed
+        # The step from any integer x that stays clear of the walls.
+        step = round_half_away(self.width + speed) - self.width
+        paths = round_half_away(x + speed)[:, None] + step * np.arange(self.frames)
+        if action == LEFT:
+            return np.maximum(paths, 0)
+        return np.minimum(paths, self.width - self.agent_width)
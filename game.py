@@ -1,16 +1,66 @@
-import random
-
 import gymnasium as gym
 from gymnasium import spaces
 import numpy as np
-import pygame
+
+import assets
 from direction import Direction
 from laser import Laser
 from levels import Levels
-from agent import Agent
+from agent import SPRITES, Agent
+from physics import AGENT_COLLISIONS
+from rasterizer import Rasterizer
+from recorder import EpisodeRecorder
+from stage_timer import StageTimer
 import time
 
 
+REWARDS = {
+    'time_passing': 0.0, # every step
+    'shoot_when_shooting': -0.0, # every step
+    'hit_ball': 0.0, # up to 16x per episode
+    'pop_ball': 0.0, # up to 8x per episode
+    'finish_level': 10000.0, # up to 8x per episode
+    'game_over': -0.0, # once per episode
+    'laser_sim': 0.01, # every step
+    'off_center': -9.0, # every step
+}
+# Reward terms computed at the end of every step by the Game method of the
+# same name with a leading underscore. They are only computed when their
+# weight is non-zero or they are logged.
+SHAPING_TERMS = ('laser_sim', 'off_center')
+# Reward terms earned by events of a physics frame, counted every step.
+EVENT_TERMS = ('hit_ball', 'pop_ball', 'finish_level', 'game_over')
+
+
+def reward_weights(config):
+    """REWARDS, with the weights of config['rewards'] overriding them."""
+    rewards = dict(REWARDS)
+    overrides = config.get('rewards', {})
+    unknown = set(overrides) - set(REWARDS)
+    if unknown:
+        raise ValueError(f"Unknown reward terms: {sorted(unknown)}")
+
+    rewards.update(overrides)
+    return rewards
+
+
+def observation_size(max_balls, ball_mask=False):
+    """
+    Length of a Game observation: the radius, x, y, xspeed and yspeed of
+    max_balls ball slots (one block per feature), the laser length and the
+    agent's position, then one validity flag per slot if ball_mask is set.
+    """
+    return 5 * max_balls + 2 + (max_balls if ball_mask else 0)
+
+
+# Stages of Game.step timed when the 'profile' option is set.
+STEP_STAGES = ('agent', 'laser', 'balls', 'collisions', 'shaping', 'obs', 'render')
+
+# Layout of the scalars at the start of a get_state buffer.
+STATE_SCALARS = 9
+DIRECTIONS = list(Direction)
+MASK_64 = (1 << 64) - 1
+
 
 class Game(gym.Env):
 
@@ -19,46 +69,82 @@ class Game(gym.Env):
         self.steps = 0
         self.render_mode = config.get('render_mode', 'human')
         self.fps = config.get('fps', 60)
-        self.rewards = {
-            'time_passing': 0.0, # every step
-            'shoot_when_shooting': -0.0, # every step
-            'hit_ball': 0.0, # up to 16x per episode
-            'pop_ball': 0.0, # up to 8x per episode
-            'finish_level': 10000.0, # up to 8x per episode
-            'game_over': -0.0, # once per episode
-            'laser_sim': 0.01 # every step
-        }
+        self.rewards = reward_weights(config)
+        # Shaping terms computed even when unweighted, and event terms
+        # counted, returned (before weighting) in the info of every step.
+        self.log_rewards = tuple(config.get('log_rewards', ()))
+        unknown = set(self.log_rewards) - set(SHAPING_TERMS) - set(EVENT_TERMS)
+        if unknown:
+            raise ValueError(f"Unknown logged reward terms: {sorted(unknown)}")
+        self.events = dict.fromkeys(EVENT_TERMS, 0)
         self.window = None
         self.clock = None
         self.width = config.get('width', 720)
+        # Agent-vs-ball test: 'mask' (pixel-exact), 'rect' or 'capsule'.
+        self.collision = config.get('collision', 'mask')
+        if self.collision != 'mask' and self.collision not in AGENT_COLLISIONS:
+            raise ValueError(f"Unknown collision mode: {self.collision}")
         self.height = round(self.width / 1.87) # 385
-        pygame.font.init()
-        font = pygame.font.Font('freesansbold.ttf', 32)
-        self.win = font.render('Level Complete!', True,
-                               (0,255,0), (0,0,100))
-        self.lose = font.render('Game Over...', True,
-                                (240,20,20), (80,0,80))
-        self.textRect = self.win.get_rect()
-        self.textRect.centerx = self.width / 2
-        self.textRect.centery = self.height / 3
-
+        # Physics frames each action is repeated for.
+        self.frame_skip = config.get('frame_skip', 1)
+        if self.frame_skip < 1:
+            raise ValueError("frame_skip must be at least 1.")
+        # Time every stage of step (see perf_stats).
+        self.timer = StageTimer(STEP_STAGES) if config.get('profile', False) else None
+        # Record every episode into record_dir (see recorder.py), once the
+        # first one starts.
+        self.config = dict(config)
+        self.recorder = None
+
+        # pygame is only imported when rendering (or testing mask
+        # collisions); sprites and text are loaded on first use.
         if self.render_mode == "human":
+            import pygame
             pygame.init()
             pygame.display.init()
             self.window = pygame.display.set_mode((self.width, self.height))
             self.clock = pygame.time.Clock()
 
         # Initialize game sprites
-        self.rand_lvl = random.Random()
         self.agent = Agent(self.width / 2, self.height, self.width, self.fps)
         self.agent.laser = Laser(self.width, self.height, self.agent.rect.height, self.fps)
-        self.levels = Levels(self.width, self.height, self.fps)
-        self.level = self.rand_lvl.randint(1,7)
+        # Random levels are drawn from a bank of level_bank_size layouts
+        # generated from level_seed, shared by every game in the process.
+        self.levels = Levels(self.width, self.height, self.fps,
+                             config.get('level_bank_size', 4096), config.get('level_seed', 0))
+        self.level = 1
         self.balls = self.levels.get(self.level)
 
+        # Observed ball slots. Without ball_mask, fewer balls are padded by
+        # repeating them; with it, empty slots are zero and flagged invalid.
+        self.max_balls = config.get('max_balls', 16)
+        self.ball_mask = config.get('ball_mask', False)
+        # Return a copy of the observation buffer, which is reused every step.
+        self.copy_obs = config.get('copy_obs', True)
+        size = observation_size(self.max_balls, self.ball_mask)
         self.action_space = gym.spaces.Discrete(4)
-        self.observation_space = spaces.Box(low=-1.0, high=1.0, shape=(82,))
-        self.observation = np.zeros(self.observation_space.shape)
+        self.observation_space = spaces.Box(low=-1.0, high=1.0, shape=(size,))
+        self._obs = np.zeros(size, dtype=np.float32)
+        self._ball_features = np.zeros((5, self.max_balls))
+        self._padding = np.arange(self.max_balls)
+        # 'vector' for ball features, or 'pixels' for frames drawn by a
+        # Rasterizer at pixel_resolution (width, height) with pixel_channels
+        # channels (3 for RGB, 1 for grayscale).
+        self.obs_type = config.get('obs_type', 'vector')
+        self.rasterizer = None
+        if self.obs_type == 'pixels':
+            self.rasterizer = Rasterizer(self.width, self.height,
+                                         config.get('pixel_resolution', (120, 64)),
+                                         config.get('pixel_channels', 3))
+            self.observation_space = spaces.Box(low=0, high=255, shape=self.rasterizer.shape, dtype=np.uint8)
+            self._frames = self.rasterizer.frames(1)
+            self._obs = self._frames[0]
+        elif self.obs_type != 'vector':
+            raise ValueError(f"Unknown observation type: {self.obs_type}")
+
+        self.observation = self._obs
+        # Frame history of the lookback subclasses, saved with the state.
+        self.history = None
 
         self._action_to_direction = {
             0: Direction.LEFT,
@@ -68,20 +154,45 @@ class Game(gym.Env):
         }
 
     def reset(self, seed=None, options=None):
+        """
+        Start an episode on a random level chosen by the environment's RNG,
+        which seed reseeds, or on the fixed level options['level'] (1-7).
+        """
+        record_dir = self.config.get('record_dir')
+        if record_dir and self.recorder is None:
+            columns = ('reward',) + self.log_rewards if self.config.get('record_rewards', False) else ()
+            self.recorder = EpisodeRecorder(record_dir, type(self).__name__, self.config,
+                                            self.observation_space, columns,
+                                            self.config.get('record_observe_every', 0),
+                                            self.config.get('record_chunk_episodes', 64))
+        if self.recorder is not None and seed is None:
+            # Recorded episodes are replayed from their seed, so every one
+            # gets one, drawn from the environment's RNG.
+            seed = int(self.np_random.integers(2 ** 63))
+
         super().reset(seed=seed)
         self.steps = 0
         # Reset the player
         self.agent.rect.midbottom = (self.width / 2, self.height)
         self.agent.direction = Direction.STILL
+        self.agent.update_image(Direction.STILL)
         self.agent.laser.deactivate()
-        # Reset the level
-        self.level = self.rand_lvl.randint(1,7)
-        self.balls = self.levels.randomize()#self.levels.get(self.level)
+        # Reset the level (0 for a random one)
+        self.level = (options or {}).get('level', 0)
+        if self.level:
+            self.levels.get(self.level, self.balls)
+        else:
+            self.levels.randomize(self.balls, self.np_random)
+        history = None
+        if self.recorder is not None and self.history is not None:
+            history = self.history.get_state()
         self._update_obs()
         if self.render_mode == "human":
             self._render_frame()
+        if self.recorder is not None:
+            self.recorder.start(seed, self.level, self.observation, history)
 
-        return self.observation, self._get_info()
+        return self._returned_obs(), self._get_info()
 
     def step(self, action=None):
         # self.steps += 1
@@ -91,6 +202,7 @@ class Game(gym.Env):
         truncated = False
         info = {}
         if self.render_mode == "human" and action is None:
+            import pygame
             terminated = any(e.type == pygame.QUIT for e in pygame.event.get())
 
             keys = pygame.key.get_pressed()
@@ -102,11 +214,83 @@ class Game(gym.Env):
             if keys[pygame.K_UP]:
                 action = 2
 
-        # Update agent, laser, and ball sprites
+        # Repeat the action for frame_skip frames, stopping early at the end
+        # of an episode or level. The observation and the per-step shaping
+        # rewards are only computed on the last frame.
         direction = self._action_to_direction[action]
+        timer = self.timer
+        self.events = dict.fromkeys(EVENT_TERMS, 0)
+        for _ in range(self.frame_skip):
+            frame_reward, game_over, truncated = self._step_frame(direction)
+            reward += frame_reward
+            terminated = terminated or game_over
+            if self.render_mode == "human":
+                self._render_frame()
+                if timer:
+                    timer.lap('render')
+            if terminated or truncated:
+                break
+
+        if timer:
+            timer.start()
+        for name in SHAPING_TERMS:
+            logged = name in self.log_rewards
+            if self.rewards[name] or logged:
+                value = getattr(self, '_' + name)(direction)
+                reward += self.rewards[name] * value
+                if logged:
+                    info[name] = value
+
+        for name in EVENT_TERMS:
+            if name in self.log_rewards:
+                info[name] = self.events[name]
+
+        if timer:
+            timer.lap('shaping')
+        self._update_obs()
+        if timer:
+            timer.lap('obs')
+        if self.recorder is not None:
+            self.recorder.record(action, self.observation, reward, info)
+
+        return self._returned_obs(), reward, terminated, truncated, info
+
+    def _laser_sim(self, direction):
+        """
+        1 if the agent shoots exactly when a laser fired now would hit a
+        ball (simulated after updating the balls), -1 otherwise.
+        """
+        laser_sim = self.agent.laser._will_collide(self.balls, self.agent.rect.centerx)
+        return 1 if laser_sim == (direction == Direction.SHOOT) else -1
+
+    def _off_center(self, direction):
+        """1 if the agent is more than 100 pixels from the middle, else 0."""
+        middle = self.width / 2
+        return int(self.agent.rect.centerx < middle - 100 or self.agent.rect.centerx > middle + 100)
+
+    def _step_frame(self, direction):
+        """
+        Advance the agent, laser and balls by one physics frame and collect
+        its event rewards.
+
+        :return: A tuple (reward, terminated, truncated).
+        """
+        reward = 0
+        terminated = False
+        truncated = False
+        timer = self.timer
+        if timer:
+            timer.start()
+        # Update agent, laser, and ball sprites
         self.agent.step(direction)
+        if timer:
+            timer.lap('agent')
         self.agent.laser.update()
+        if timer:
+            timer.lap('laser')
         self.balls.update()
+        if timer:
+            timer.lap('balls')
 
         # nearest_ball = self.nearest_ball()
         # if abs(nearest_ball) > 0.25 * self.width:
@@ -120,79 +304,80 @@ class Game(gym.Env):
         #             if direction == Direction.LEFT:
         #                 reward += 0.005
 
-        for ball in self.balls:
-            hit = self.agent.laser.collidesWith(ball)
-            if hit:
-                new_balls = ball.pop()
-                self.agent.laser.deactivate()
-                if new_balls:
-                    reward += self.rewards['hit_ball']
-                    self.balls.add(new_balls)
-                else:
-                    reward += self.rewards['pop_ball']
-                if len(self.balls) == 0:
-                    if self.render_mode == 'human':
-                        self.window.blit(self.win, self.textRect)
-                        pygame.display.update()
-                        time.sleep(1)
-
-                    reward += self.rewards['finish_level']
-                    self.level += 1
-                    truncated = True
-                    #self.balls = self.levels.get(self.level)
-                    self.balls = self.levels.randomize()
-                    self.balls.update()
-            elif pygame.sprite.collide_mask(self.agent, ball):
-                if self.render_mode == "human":
-                    self.window.blit(self.lose, self.textRect)
-                    pygame.display.update()
-                    time.sleep(1)
-
-                reward += self.rewards['game_over']
-                terminated = True
-
-        # After updating balls, simulate laser
-        laser_sim = self.agent.laser._will_collide(self.balls, self.agent.rect.centerx)
-        shooting = direction == Direction.SHOOT
-        if laser_sim and shooting:
-            reward += self.rewards["laser_sim"]
-        elif (not laser_sim) and (not shooting):
-            reward += self.rewards["laser_sim"]
-        else:
-            reward -= self.rewards["laser_sim"]
-
-        middle = self.width / 2
-        if self.agent.rect.centerx < middle - 100 or self.agent.rect.centerx > middle + 100:
-            reward -= 9
-
-        self._update_obs()
-
-        if self.render_mode == "human":
-            self._render_frame()
-
-        return self.observation, reward, terminated, truncated, info
+        hit = self.balls.laser_hit(self.agent.laser)
+        game_overs = self.balls.agent_hits(self.agent, exclude=hit, collision=self.collision)
+        if hit is not None:
+            new_balls = self.balls.pop(hit)
+            self.agent.laser.deactivate()
+            if new_balls:
+                reward += self.rewards['hit_ball']
+                self.events['hit_ball'] += 1
+            else:
+                reward += self.rewards['pop_ball']
+                self.events['pop_ball'] += 1
+            if len(self.balls) == 0:
+                if self.render_mode == 'human':
+                    self._show_message('Level Complete!', (0,255,0), (0,0,100))
+
+                reward += self.rewards['finish_level']
+                self.events['finish_level'] += 1
+                self.level += 1
+                truncated = True
+                #self.levels.get(self.level, self.balls)
+                self.levels.randomize(self.balls, self.np_random)
+                self.balls.update()
+
+        if game_overs:
+            if self.render_mode == "human":
+                self._show_message('Game Over...', (240,20,20), (80,0,80))
+
+            reward += self.rewards['game_over'] * game_overs
+            self.events['game_over'] += game_overs
+            terminated = True
+
+        if timer:
+            timer.lap('collisions')
+        return reward, terminated, truncated
+
+    def perf_stats(self, reset=False):
+        """
+        Time spent in each stage of step since the game was created (or the
+        stats were last reset), if it was created with the 'profile' option.
+
+        :param reset: Start accumulating from zero again after reading.
+        :return: A dict mapping every stage of STEP_STAGES to its total time
+                 in seconds, call count and mean time per call in
+                 microseconds, or None if profiling is off. Stages of the
+                 physics run once per frame, the others once per step.
+        """
+        if self.timer is None:
+            return None
+
+        stats = self.timer.stats()
+        if reset:
+            self.timer.reset()
+
+        return stats
 
     def nearest_ball(self):
-        dist = self.width
-        playerX = self.agent.rect.centerx
-        for ball in self.balls:
-            d = ball.rect.centerx - playerX
-            if abs(d) < abs(dist):
-                dist = d
+        if len(self.balls) == 0:
+            return self.width
 
-        return dist
+        slots = self.balls.slots()
+        d = self.balls.rect_x[slots] + self.balls.radius[slots] - self.agent.rect.centerx
+        return d[np.argmin(np.abs(d))]
 
     def render(self):
         if self.render_mode in ("rgb_array", "human"):
             return self._render_frame()
 
     def _render_frame(self):
+        import pygame
         canvas = pygame.Surface((self.width, self.height))
         canvas.fill((0, 0, 0))
         self.agent.laser.draw(canvas)
         self.agent.draw(canvas)
-        for ball in self.balls:
-            ball.draw(canvas)
+        self.balls.draw(canvas)
 
         if self.render_mode == "human":
             self.window.blit(canvas, canvas.get_rect())
@@ -204,8 +389,21 @@ class Game(gym.Env):
                 np.array(pygame.surfarray.pixels3d(canvas)), axes=(1, 0, 2)
             )  # transpose to (1:row, 0:col, 2:channel) from (0:width, 1:height, 2:channel)
 
+    def _show_message(self, message, color, background):
+        import pygame
+        # Every message is placed where 'Level Complete!' is centered.
+        rect = assets.text('Level Complete!', (0,255,0), (0,0,100)).get_rect()
+        rect.centerx = self.width / 2
+        rect.centery = self.height / 3
+        self.window.blit(assets.text(message, color, background), rect)
+        pygame.display.update()
+        time.sleep(1)
+
     def close(self):
+        if self.recorder is not None:
+            self.recorder.close()
         if self.window is not None:
+            import pygame
             pygame.display.quit()
             pygame.quit()
 
@@ -215,54 +413,123 @@ class Game(gym.Env):
             if terminated:
                 return
 
+    def get_state(self):
+        """
+        Snapshot everything that determines how the game continues: the
+        agent's position, sprite and direction, the laser, every ball, the
+        level, the environment's RNG and the lookback history.
+
+        :return: A flat uint8 array for set_state.
+        """
+        agent, laser = self.agent, self.agent.laser
+        scalars = np.array([agent.rect.x, agent.rect.y, agent.hitbox_index,
+                            DIRECTIONS.index(agent.direction), laser.x, laser.length,
+                            laser.active, self.level, self.steps], dtype=float)
+        rng = self.np_random.bit_generator.state
+        words = np.array([rng['state']['state'] & MASK_64, rng['state']['state'] >> 64,
+                          rng['state']['inc'] & MASK_64, rng['state']['inc'] >> 64,
+                          rng['has_uint32'], rng['uinteger']], dtype=np.uint64)
+        parts = [scalars.view(np.uint8), words.view(np.uint8), self.balls.get_state()]
+        if self.history is not None:
+            parts.append(self.history.get_state())
+
+        return np.concatenate(parts)
+
+    def set_state(self, state):
+        """
+        Restore a snapshot from get_state. Every array is copied in place, so
+        restoring allocates (almost) nothing.
+        """
+        agent, laser = self.agent, self.agent.laser
+        scalars = state[:STATE_SCALARS * 8].view(float)
+        agent.rect.x, agent.rect.y = int(scalars[0]), int(scalars[1])
+        agent.hitbox_index = int(scalars[2])
+        agent.sprite = SPRITES[agent.hitbox_index]
+        agent.direction = DIRECTIONS[int(scalars[3])]
+        laser.x, laser.length, laser.active = scalars[4], scalars[5], bool(scalars[6])
+        self.level, self.steps = int(scalars[7]), int(scalars[8])
+
+        offset = STATE_SCALARS * 8
+        words = [int(word) for word in state[offset:offset + 48].view(np.uint64)]
+        self.np_random.bit_generator.state = {
+            'bit_generator': 'PCG64',
+            'state': {'state': words[0] | words[1] << 64, 'inc': words[2] | words[3] << 64},
+            'has_uint32': words[4],
+            'uinteger': words[5],
+        }
+        offset += 48
+        offset += self.balls.set_state(state[offset:])
+        if self.history is not None:
+            offset += self.history.set_state(state[offset:])
+
+        self._restore_obs()
+
     def _get_obs(self):
-        if len(self.balls) == 0:
-            ball_sizes = []
-            ball_X = []
-            ball_Y = []
-            ball_xspeed = []
-            ball_yspeed = []
-            for i in range(16):
-                ball_sizes.append(0.0)
-                ball_X.append(0.0)
-                ball_Y.append(0.0)
-                ball_xspeed.append(0.0)
-                ball_yspeed.append(0.0)
-        else:
-            ball_sizes = []
-            ball_X = []
-            ball_Y = []
-            ball_xspeed = []
-            ball_yspeed = []
-            for ball in self.balls:
-                ball_sizes.append(ball.radius / min(self.width, self.height))
-                ball_X.append(max(min(ball.rect.centerx / self.width, 1), 0))
-                ball_Y.append(max(min(ball.rect.centery / self.height, 1), 0))
-                ball_xspeed.append(ball.xspeed / self.width)
-                ball_yspeed.append(ball.yspeed / self.height)
-
-            n = len(ball_sizes)
-            not_filled = n < 16
-            while not_filled:
-                for ball_idx in range(n):
-                    ball_sizes.append(ball_sizes[ball_idx])
-                    ball_X.append(ball_X[ball_idx])
-                    ball_Y.append(ball_Y[ball_idx])
-                    ball_xspeed.append(ball_xspeed[ball_idx]  )
-                    ball_yspeed.append(ball_yspeed[ball_idx])
-                    if len(ball_sizes) == 16:
-                        not_filled = False
-                        break
-
-        obs_list = (ball_sizes + ball_X + ball_Y + ball_xspeed + ball_yspeed
-                    + [self.agent.laser.length / self.height,
-                       self.agent.rect.centerx / self.width])
-
-        return np.array(obs_list).astype(np.float32)
+        """
+        Write the observation of the current frame into a buffer that is
+        reused every step, and return it. Beyond max_balls, the oldest balls
+        are observed.
+        """
+        if self.rasterizer is not None:
+            return self._get_pixels()
+
+        m = self.max_balls
+        balls = self.balls
+        slots = balls.slots()[:m]
+        n = len(slots)
+        if n and not self.ball_mask:
+            # Fewer than max_balls balls are padded by repeating them in order.
+            slots = slots[self._padding % n]
+            n = m
+
+        features = self._ball_features
+        radius, x, y, xspeed, yspeed = features[:, :n]
+        np.take(balls.radius, slots, out=radius)
+        np.take(balls.rect_x, slots, out=x)
+        x += radius
+        x /= self.width
+        np.clip(x, 0, 1, out=x)
+        np.take(balls.rect_y, slots, out=y)
+        y += radius
+        y /= self.height
+        np.clip(y, 0, 1, out=y)
+        np.take(balls.xspeed, slots, out=xspeed)
+        xspeed /= self.width
+        np.take(balls.yspeed, slots, out=yspeed)
+        yspeed /= self.height
+        radius /= min(self.width, self.height)
+        features[:, n:] = 0.0
+
+        obs = self._obs
+        obs[:5 * m].reshape(5, m)[:] = features
+        obs[5 * m] = self.agent.laser.length / self.height
+        obs[5 * m + 1] = self.agent.rect.centerx / self.width
+        if self.ball_mask:
+            obs[5 * m + 2:5 * m + 2 + n] = 1.0
+            obs[5 * m + 2 + n:] = 0.0
+
+        return obs
+
+    def _get_pixels(self):
+        """Draw the current frame into the reused pixel buffer and return it."""
+        balls, laser = self.balls, self.agent.laser
+        self.rasterizer.draw(self._frames, np.zeros(1, dtype=int), balls.active[None],
+                             balls.level[None], (balls.rect_x + balls.radius)[None],
+                             (balls.rect_y + balls.radius)[None], balls.radius[None],
+                             tuple(np.array([value]) for value in self.agent.hitbox()),
+                             np.array([laser.active]), np.array([laser.x]),
+                             np.array([laser.length]), laser.width)
+        return self._obs
 
     def _update_obs(self):
         self.observation = self._get_obs()
 
+    def _restore_obs(self):
+        self.observation = self._get_obs()
+
+    def _returned_obs(self):
+        return self.observation.copy() if self.copy_obs else self.observation
+
     def _get_info(self):
         return {key:0 for key, val in self.rewards.items()}
 
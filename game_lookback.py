@@ -1,24 +1,67 @@
-import gymnasium as gym
 from gymnasium import spaces
 import numpy as np
-import pygame
-from direction import Direction
-from laser import Laser
-from levels import Levels
-from agent import Agent
 from game import Game
 
+
+class FrameHistory:
+    """
+    The last `lookback` frame observations, oldest first, in a ring buffer.
+
+    Every frame is written twice, `lookback` rows apart, so the ordered
+    history is always a contiguous slice of one preallocated buffer and
+    pushing a frame costs the same whatever the lookback.
+    """
+
+    def __init__(self, size, lookback):
+        self.lookback = lookback
+        self.buffer = np.zeros((2 * lookback, size), dtype=np.float32)
+        self.index = 0
+
+    def push(self, frame):
+        self.buffer[self.index] = frame
+        self.buffer[self.index + self.lookback] = frame
+        self.index = (self.index + 1) % self.lookback
+
+    def window(self):
+        """View of the history with shape (lookback, size), oldest first."""
+        return self.buffer[self.index:self.index + self.lookback]
+
+    def get_state(self):
+        """The history as one flat uint8 buffer for set_state."""
+        return np.concatenate((np.array([self.index], dtype=np.int64).view(np.uint8),
+                               self.buffer.reshape(-1).view(np.uint8)))
+
+    def set_state(self, state):
+        """
+        Restore a buffer from get_state.
+
+        :param state: A uint8 array starting with the buffer.
+        :return: The number of bytes read.
+        """
+        self.index = int(state[:8].view(np.int64)[0])
+        buffer = self.buffer.reshape(-1).view(np.uint8)
+        buffer[:] = state[8:8 + len(buffer)]
+        return 8 + len(buffer)
+
+
 class Game2D(Game):
 
     def __init__(self, config):
         super().__init__(config)
         self.name = "2D"
+        if self.obs_type != 'vector':
+            raise ValueError("Lookback observations need obs_type 'vector'.")
+
         lookback = config.get("lookback", 64)
-        self.observation = np.zeros((82, 1, lookback))
-        self.observation_space = spaces.Box(low=0.0, high=1.0, shape=(82, 1, lookback))
+        size = self.observation_space.shape[0]
+        self.history = FrameHistory(size, lookback)
+        self.observation_space = spaces.Box(low=0.0, high=1.0, shape=(size, 1, lookback))
+        self._restore_obs()
 
     def _update_obs(self):
-        obs = self._get_obs()
-        self.observation[:, :, :-1] = self.observation[:, :, 1:]
-        self.observation[:, :, -1] = obs
+        self.history.push(self._get_obs())
+        self._restore_obs()
 
+    def _restore_obs(self):
+        # Transposed view of the history: features by time, oldest first.
+        self.observation = self.history.window().T[:, None, :]
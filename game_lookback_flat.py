@@ -1,12 +1,11 @@
-import gymnasium as gym
 from gymnasium import spaces
 import numpy as np
-import pygame
-from direction import Direction
-from laser import Laser
-from levels import Levels
-from agent import Agent
 from game import Game
+from game_lookback import FrameHistory
+
+# Orders the flattened history can be laid out in: feature by feature (each
+# feature's history, oldest first) or frame by frame, oldest first.
+FLAT_ORDERS = ('feature', 'time')
 
 
 class Game2DFlat(Game):
@@ -14,15 +13,31 @@ class Game2DFlat(Game):
     def __init__(self, config):
         super().__init__(config)
         self.name = "2DFlat"
+        if self.obs_type != 'vector':
+            raise ValueError("Lookback observations need obs_type 'vector'.")
+
         lookback = config.get("lookback", 64)
-        self.observation_box = np.zeros((82, lookback))
-        self.observation_space = spaces.Box(low=0.0, high=1.0, shape=(82*lookback,))
-        self.observation_box = np.zeros((82, lookback))
-        self.observation = np.zeros(self.observation_space.shape)
+        # 'feature' is the layout models were trained on; 'time' flattens
+        # the history without copying it.
+        self.flat_order = config.get("flat_order", 'feature')
+        if self.flat_order not in FLAT_ORDERS:
+            raise ValueError(f"flat_order must be one of {FLAT_ORDERS}.")
 
+        size = self.observation_space.shape[0]
+        self.history = FrameHistory(size, lookback)
+        self.observation_space = spaces.Box(low=0.0, high=1.0, shape=(size*lookback,))
+        self.observation_box = np.zeros((size, lookback), dtype=np.float32)
+        self._restore_obs()
 
     def _update_obs(self):
-        obs = self._get_obs()
-        self.observation_box[:, :-1] = self.observation_box[:, 1:]
-        self.observation_box[:, -1] = obs
-        self.observation = self.observation_box.reshape(self.observation_space.shape)
+        self.history.push(self._get_obs())
+        self._restore_obs()
+
+    def _restore_obs(self):
+        if self.flat_order == 'time':
+            # The history is contiguous, so flattening it is a view: frame by
+            # frame, oldest first.
+            self.observation = self.history.window().reshape(-1)
+        else:
+            self.observation_box[:] = self.history.window().T
+            self.observation = self.observation_box.reshape(-1)
@@ -0,0 +1,10 @@
+from game import Game
+from game_lookback import Game2D
+from game_lookback_flat import Game2DFlat
+
+# Environment classes by the name configs and recordings refer to them by.
+GAMES = {
+    'Game': Game,
+    'Game2D': Game2D,
+    'Game2DFlat': Game2DFlat,
+}
@@ -0,0 +1,146 @@
+"""
+Generate an offline dataset of transitions by playing headless games with a
+fixed policy (random, scripted, expert or a restored RLlib checkpoint) in a
+pool of worker processes.
+
+Transitions (obs, action, reward, terminated, truncated) fill shards of
+--shard-steps each, written as .npz files next to a manifest.json. Shard i
+is played from seed --seed + i, so every shard is deterministic, and running
+the command again only generates the shards that are missing.
+
+    python generate_dataset.py --out Datasets/random --policy random --shards 64 --workers 8
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+
+import numpy as np
+
+from games import GAMES
+from policies import make_policy, play_episode
+
+# Policies loaded by each worker, by checkpoint, so a checkpoint is only
+# restored once per process.
+_CHECKPOINT_POLICIES = {}
+
+
+def shard_file(index):
+    return f"shard-{index:05d}.npz"
+
+
+def generate_shard(task):
+    """
+    Play games from the shard's seed until it holds its number of steps,
+    resetting them whenever an episode ends or a level is cleared.
+
+    :param task: A tuple (out, index, seed, game, env_config, steps, policy,
+                 checkpoint).
+    :return: The shard's manifest entry.
+    """
+    out, index, seed, game_name, env_config, steps, policy_name, checkpoint = task
+    game = GAMES[game_name](dict(env_config, render_mode=None))
+    if policy_name == 'checkpoint':
+        policy = _CHECKPOINT_POLICIES.get(checkpoint)
+        if policy is None:
+            policy = _CHECKPOINT_POLICIES[checkpoint] = make_policy(policy_name, checkpoint=checkpoint)
+    else:
+        policy = make_policy(policy_name, seed=seed)
+
+    space = game.observation_space
+    obs = np.zeros((steps,) + space.shape, dtype=space.dtype)
+    action = np.zeros(steps, dtype=np.uint8)
+    reward = np.zeros(steps, dtype=np.float32)
+    terminated = np.zeros(steps, dtype=bool)
+    truncated = np.zeros(steps, dtype=bool)
+    t = 0
+
+    def record(observation, act, rew, term, trunc):
+        nonlocal t
+        obs[t], action[t], reward[t], terminated[t], truncated[t] = observation, act, rew, term, trunc
+        t += 1
+
+    observation, _ = game.reset(seed=seed)
+    episodes = 1
+    while t < steps:
+        observation, _, _, term, trunc, _ = play_episode(policy, game, observation, steps - t, record)
+        if term or trunc:
+            observation, _ = game.reset()
+            episodes += 1
+    game.close()
+
+    filename = os.path.join(out, shard_file(index))
+    with open(filename + ".tmp", 'wb') as f:
+        np.savez(f, obs=obs, action=action, reward=reward, terminated=terminated, truncated=truncated)
+    os.replace(filename + ".tmp", filename)
+    return {'index': index, 'file': shard_file(index), 'seed': seed, 'steps': steps,
+            'episodes': episodes, 'reward': float(reward.sum()),
+            'terminated': int(terminated.sum()), 'truncated': int(truncated.sum())}
+
+
+def write_manifest(out, manifest):
+    filename = os.path.join(out, "manifest.json")
+    with open(filename + ".tmp", 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(filename + ".tmp", filename)
+
+
+def generate(out, game, env_config, policy, checkpoint, shards, shard_steps, seed, workers):
+    """
+    Generate the shards missing from out and update its manifest as each
+    one is written.
+
+    :return: The manifest.
+    """
+    os.makedirs(out, exist_ok=True)
+    settings = {'game': game, 'env_config': env_config, 'policy': policy, 'checkpoint': checkpoint,
+                'shard_steps': shard_steps, 'seed': seed}
+    filename = os.path.join(out, "manifest.json")
+    manifest = {'settings': settings, 'shards': []}
+    if os.path.exists(filename):
+        with open(filename) as f:
+            manifest = json.load(f)
+        if manifest['settings'] != settings:
+            raise ValueError(f"{out} was generated with different settings: {manifest['settings']}")
+
+    # Shards are only listed once their file is complete.
+    done = {entry['index'] for entry in manifest['shards']
+            if os.path.exists(os.path.join(out, entry['file']))}
+    manifest['shards'] = [entry for entry in manifest['shards'] if entry['index'] in done]
+    tasks = [(out, i, seed + i, game, env_config, shard_steps, policy, checkpoint)
+             for i in range(shards) if i not in done]
+    write_manifest(out, manifest)
+    if not tasks:
+        return manifest
+
+    with mp.Pool(min(workers, len(tasks))) as pool:
+        for entry in pool.imap_unordered(generate_shard, tasks):
+            manifest['shards'].append(entry)
+            manifest['shards'].sort(key=lambda shard: shard['index'])
+            write_manifest(out, manifest)
+            print(f"shard {entry['index']}: {entry['steps']} steps, {entry['episodes']} episodes")
+
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('--out', required=True, help="Directory of the shards and manifest.")
+    parser.add_argument('--game', default='Game', choices=sorted(GAMES))
+    parser.add_argument('--env-config', default='{}', help="Env config, as JSON.")
+    parser.add_argument('--policy', default='random', choices=['random', 'scripted', 'expert', 'checkpoint'])
+    parser.add_argument('--checkpoint', help="Checkpoint of the checkpoint policy.")
+    parser.add_argument('--shards', type=int, default=16)
+    parser.add_argument('--shard-steps', type=int, default=10000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    manifest = generate(args.out, args.game, json.loads(args.env_config), args.policy,
+                        args.checkpoint, args.shards, args.shard_steps, args.seed, args.workers)
+    print(f"{len(manifest['shards'])} shards, "
+          f"{sum(entry['steps'] for entry in manifest['shards'])} steps in {args.out}")
+
+
+if __name__ == "__main__":
+    main()
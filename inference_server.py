@@ -0,0 +1,246 @@
+"""
+Batched inference for many env processes: a server process loads a
+checkpoint's module once and answers the observations clients send it with
+one forward pass per micro-batch.
+
+Every client owns a slot of shared memory that it writes its observation
+into before sending its slot number down a queue. The server waits for the
+first request, keeps gathering requests for at most latency_ms (or until
+max_batch are pending), runs the module on the gathered slots at once and
+writes each client's action back into its slot. Clients are policies, so
+they play Games like the policies of policies.py.
+
+    python inference_server.py --checkpoint Results/ppo_1D_v5/checkpoint-007412 --clients 16 --episodes 256
+"""
+import argparse
+import ctypes
+import json
+import multiprocessing as mp
+import os
+import queue
+import time
+import traceback
+
+import numpy as np
+
+from async_vector_game import _shared, _view
+from games import GAMES
+from policies import play_clients
+
+
+def load_module(checkpoint):
+    """
+    Restore the module of an RLlib algorithm's checkpoint (saved by
+    Algorithm.save), without building the algorithm and its rollout workers:
+    from the module checkpoint its learner wrote under learner/module_state/.
+
+    :return: A function mapping a batch of observations to greedy actions.
+    """
+    import torch
+    from ray.rllib.core.rl_module.rl_module import RLModule
+    from ray.rllib.policy.sample_batch import DEFAULT_POLICY_ID, SampleBatch
+
+    module = RLModule.from_checkpoint(os.path.join(checkpoint, "learner", "module_state",
+                                                   DEFAULT_POLICY_ID))
+    module.eval()
+
+    def forward(observations):
+        with torch.no_grad():
+            output = module.forward_inference({SampleBatch.OBS: torch.from_numpy(observations)})
+        return output[SampleBatch.ACTION_DIST_INPUTS].argmax(dim=-1).numpy()
+
+    return forward
+
+
+class InferenceClient:
+    """
+    One slot of an InferenceServer. Clients are passed to the processes
+    using them when those are started.
+    """
+
+    def __init__(self, slot, raws, shape, dtype, requests, ready, error):
+        self.slot = slot
+        self.raws = raws
+        self.shape = shape
+        self.dtype = dtype
+        self.requests = requests
+        self.ready = ready
+        self.error = error
+        self._observations = None
+        self._actions = None
+
+    def __getstate__(self):
+        return {name: value for name, value in self.__dict__.items()
+                if name not in ('_observations', '_actions')}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state, _observations=None, _actions=None)
+
+    def compute_action(self, observation):
+        if self._observations is None:
+            self._observations = _view(self.raws['observations'], self.shape, self.dtype)
+            self._actions = _view(self.raws['actions'], self.shape[:1], np.int64)
+
+        self._observations[self.slot] = observation
+        self.requests.put(self.slot)
+        self.ready.acquire()
+        if self.error.value:
+            raise RuntimeError(f"The inference server failed:\n{self.error.value.decode()}")
+        return int(self._actions[self.slot])
+
+    def act(self, game, observation):
+        return self.compute_action(observation)
+
+
+class InferenceServer:
+
+    def __init__(self, checkpoint, observation_space, clients, max_batch=None, latency_ms=2.0,
+                 load=load_module, start_method=None):
+        """
+        :param observation_space: The observation space of the clients' games.
+        :param clients: Number of client slots.
+        :param max_batch: Requests that end a micro-batch early (clients by
+                          default).
+        :param latency_ms: Longest a request waits for others to join its
+                           micro-batch.
+        :param load: Function restoring the checkpoint in the server process,
+                     as a function of a batch of observations (see
+                     load_module).
+        """
+        if latency_ms < 0:
+            raise ValueError("latency_ms must not be negative.")
+
+        self.checkpoint = checkpoint
+        self.clients = clients
+        self.max_batch = clients if max_batch is None else max_batch
+        if not 1 <= self.max_batch <= clients:
+            raise ValueError("max_batch must be between 1 and the number of clients.")
+
+        self.latency = latency_ms / 1000
+        self.shape = (clients,) + observation_space.shape
+        self.dtype = np.dtype(observation_space.dtype)
+        ctx = mp.get_context(start_method)
+        self.raws = {}
+        self.raws['observations'], _ = _shared(ctx, self.shape, self.dtype)
+        self.raws['actions'], _ = _shared(ctx, (clients,), np.int64)
+        # Number of batches and of requests served, then the error if the
+        # server failed.
+        self.raws['counts'], self.counts = _shared(ctx, (2,), np.int64)
+        self.error = ctx.Array(ctypes.c_char, 4096)
+        self.requests = ctx.Queue()
+        self.ready = [ctx.Semaphore(0) for _ in range(clients)]
+        self.process = ctx.Process(target=_serve, name="InferenceServer", daemon=True,
+                                   args=(load, checkpoint, self.raws, self.shape, self.dtype,
+                                         self.requests, self.ready, self.error, self.max_batch,
+                                         self.latency))
+
+    def start(self):
+        self.process.start()
+        return self
+
+    def client(self, slot):
+        """The client of a slot, to be handed to the process using it."""
+        return InferenceClient(slot, self.raws, self.shape, self.dtype, self.requests,
+                               self.ready[slot], self.error)
+
+    def stats(self):
+        """
+        :return: A dict with the number of micro-batches and requests served
+                 so far, and the mean batch size.
+        """
+        batches, requests = (int(count) for count in self.counts)
+        return {'batches': batches, 'requests': requests,
+                'mean_batch': requests / batches if batches else 0.0}
+
+    def close(self):
+        if self.process.is_alive():
+            self.requests.put(-1)
+            self.process.join()
+        if self.error.value:
+            raise RuntimeError(f"The inference server failed:\n{self.error.value.decode()}")
+
+
+def _serve(load, checkpoint, raws, shape, dtype, requests, ready, error, max_batch, latency):
+    """The server process: answer micro-batches of requests until closed."""
+    observations = _view(raws['observations'], shape, dtype)
+    actions = _view(raws['actions'], shape[:1], np.int64)
+    counts = _view(raws['counts'], (2,), np.int64)
+    try:
+        forward = load(checkpoint)
+        while True:
+            slots = [requests.get()]
+            if slots[0] < 0:
+                return
+
+            deadline = time.perf_counter() + latency
+            closing = False
+            while len(slots) < max_batch:
+                try:
+                    slot = requests.get(timeout=max(deadline - time.perf_counter(), 0))
+                except queue.Empty:
+                    break
+                if slot < 0:
+                    closing = True
+                    break
+                slots.append(slot)
+
+            slots = np.array(slots)
+            actions[slots] = forward(observations[slots])
+            counts += (1, len(slots))
+            for slot in slots:
+                ready[slot].release()
+            if closing:
+                return
+    except Exception:
+        error.value = traceback.format_exc().encode()[-4095:]
+        # Release every client, which would otherwise wait forever.
+        for semaphore in ready:
+            semaphore.release()
+
+
+def run(server, game, env_config, episodes, seed=0, max_steps=None):
+    """
+    Play episodes of random levels from seeds seed..seed + episodes - 1,
+    spread over one process per client of a started server.
+
+    :return: The episodes' summaries (see policies.play), by seed.
+    """
+    return play_clients(server, game, env_config, [(seed + i, 0) for i in range(episodes)], max_steps)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument('--checkpoint', required=True)
+    parser.add_argument('--game', default='Game', choices=sorted(GAMES))
+    parser.add_argument('--env-config', default='{}', help="Env config, as JSON.")
+    parser.add_argument('--clients', type=int, default=os.cpu_count())
+    parser.add_argument('--max-batch', type=int, help="Requests per micro-batch (default: clients).")
+    parser.add_argument('--latency-ms', type=float, default=2.0)
+    parser.add_argument('--episodes', type=int, default=64)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--max-steps', type=int, default=10000)
+    parser.add_argument('--out', help="Write the episodes and server stats to this JSON file.")
+    args = parser.parse_args()
+
+    env_config = dict(json.loads(args.env_config), render_mode=None)
+    env = GAMES[args.game](env_config)
+    server = InferenceServer(args.checkpoint, env.observation_space, args.clients,
+                             args.max_batch, args.latency_ms).start()
+    env.close()
+    start = time.perf_counter()
+    summaries = run(server, args.game, env_config, args.episodes, args.seed, args.max_steps)
+    elapsed = time.perf_counter() - start
+    server.close()
+
+    stats = server.stats()
+    steps = sum(summary['length'] for summary in summaries)
+    print(f"{len(summaries)} episodes, {steps} steps in {elapsed:.1f}s ({steps / elapsed:.0f} steps/s)")
+    print(f"mean return {np.mean([summary['return'] for summary in summaries]):.3f}, "
+          f"{stats['batches']} batches of {stats['mean_batch']:.1f} observations on average")
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump({'episodes': summaries, 'server': stats, 'seconds': elapsed}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
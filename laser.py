@@ -1,9 +1,10 @@
-import pygame
+import numpy as np
 
+from trajectory import predict_laser_hits
 
-class Laser(pygame.sprite.Sprite):
+
+class Laser:
     def __init__(self, width, height, agent_height, fps):
-        super().__init__()
         self.x = 0.0
         self.agent_height = agent_height
         self.width = int(width / 500.0)
@@ -37,60 +38,31 @@ class Laser(pygame.sprite.Sprite):
 
             self.length = min(self.length + self.speed, self.display_height)
 
-    def collidesWith(self, ball):
-        # lasers is inactive
-        if not self.active:
-            return False
-
-        ball_x, ball_y = ball.rect.center
-        ball_radius = ball.radius
-
-        if (ball_y + ball_radius) < (self.display_height - self.length):
-            # ball is above laser
-            return False
-
-        if (ball_x + ball_radius) < self.x:
-            # ball is left of laser
-            return False
-
-        if (ball_x - ball_radius) > self.x:
-            # ball is right of laser
-            return False
-
-        if (self.display_height - self.length < ball_y + ball_radius
-            and self.display_height > ball_y - ball_radius):
-            return True
-
-        return False
-
-
     def draw(self, canvas):
         if self.active:
+            import pygame
             rect = pygame.Rect(self.x, self.display_height - self.length, self.width, self.length)
             pygame.draw.rect(canvas, (255, 0, 0), rect)
 
-    def copy(self):
-        new_laser = Laser(self.width, self.display_height, self.agent_height, self.fps)
-        new_laser.x = self.x
-        new_laser.length = self.length
-        new_laser.active = self.active
-        return new_laser
-
     def _will_collide(self, balls, x=None):
-        laser_copy = self.copy()
-        if not laser_copy.active:
-            laser_copy.deactivate()
-            laser_copy.fire(x)
+        """
+        Predict whether the laser will hit a ball before it tops out, if it is
+        fired now from x (or keeps going, if it is already active).
 
-        ball_copies = [ball.copy() for ball in balls]
-        while(laser_copy.active):
-            laser_copy.update()
-            for ball_copy in ball_copies:
-                ball_copy.update()
-                if laser_copy.collidesWith(ball_copy):
-                    return True
+        The laser's and the balls' paths are looked up in closed form by
+        trajectory.predict_laser_hits rather than by stepping copies of them.
+        As the ball copies this replaces did, every ball is predicted to
+        restart from rest, moving right.
 
-        return False
+        :param balls: The BallStore holding the balls.
+        :param x: The x-coordinate the laser would be fired from.
+        :return: True if the laser is predicted to hit a ball.
+        """
+        return bool(predict_laser_hits(
+            balls.trajectories, np.array([self.active]), np.array([self.x]),
+            np.array([self.length]), np.array([x]), balls.active[None], balls.table[None],
+            balls.x[None], balls.y[None], balls.radius[None], self.speed,
+            self.agent_height, self.display_width, self.display_height)[0])
 
     def __repr__(self):
         return f"({self.x}, {self.display_height - self.length}:{self.display_height})"
@@ -1,8 +1,9 @@
-import random
+import json
+import os
 
-import pygame.display
+import numpy as np
 
-from ball import *
+from ball_store import BallStore
 
 RED = (255, 0, 0)
 YELLOW = (245, 237, 7)
@@ -11,74 +12,169 @@ BLUE = (128, 206, 242)
 ORANGE = (237, 141, 45)
 PURPLE = (111, 38, 163)
 COLORS = [RED, YELLOW, GREEN, BLUE, ORANGE, PURPLE]
+COLOR_NAMES = {'RED': RED, 'YELLOW': YELLOW, 'GREEN': GREEN, 'BLUE': BLUE,
+               'ORANGE': ORANGE, 'PURPLE': PURPLE}
+
+LEVELS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "levels.json")
+# Random levels keep adding balls until clearing them takes this many hits;
+# LEVEL_COST is the number of hits a ball of each level takes.
+RANDOM_LEVEL_TOTAL = 20
+LEVEL_COST = np.array([0, 1, 3, 7, 15])
+# Random balls are added without passing the game's fps, so every random
+# ball (and everything split from it) moves at BallStore.add's default.
+RANDOM_LEVEL_FPS = 36
+
+# Banks shared by every Levels in the process, keyed by their arguments.
+_BANKS = {}
+
+
+class LevelBank:
+    """
+    Ball layouts stored as flat arrays with one row per ball. The balls of
+    layout i are rows start[i]:start[i + 1], in the order they are added.
+    """
+
+    def __init__(self, level, x, y, color, timestep, start):
+        self.level = level
+        self.x = x
+        self.y = y
+        self.color = color
+        self.timestep = timestep
+        self.start = start
+
+    def __len__(self):
+        return len(self.start) - 1
+
+    def max_balls(self):
+        """
+        Most balls any layout can have in play at once: a ball of level k
+        splits into at most 2 ** (k - 1) balls.
+        """
+        layouts = np.repeat(np.arange(len(self)), np.diff(self.start))
+        return int(np.bincount(layouts, 2 ** (self.level - 1.0), minlength=len(self)).max(initial=0))
+
+    def rows(self, layouts):
+        """
+        Rows of the balls of several layouts.
+
+        :param layouts: Int array of layout indices.
+        :return: A tuple (index, slot, row) of int arrays with one entry per
+                 ball: the position of its layout in layouts, its position
+                 in that layout, and its row in the bank.
+        """
+        counts = self.start[layouts + 1] - self.start[layouts]
+        index = np.repeat(np.arange(len(layouts)), counts)
+        slot = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return index, slot, self.start[layouts][index] + slot
+
+    def load(self, layout, balls):
+        """Replace the balls of a BallStore with a layout's."""
+        rows = slice(self.start[layout], self.start[layout + 1])
+        balls.load(self.level[rows], self.x[rows], self.y[rows], self.color[rows], self.timestep[rows])
+        return balls
+
+    @classmethod
+    def from_file(cls, width, height, fps, filename=LEVELS_FILE):
+        """
+        Fixed levels defined in a JSON data file, placed on a display of the
+        given size.
+        """
+        with open(filename) as f:
+            layouts = json.load(f)['levels']
+
+        def place(coordinate, size):
+            a, b, c = coordinate
+            return a * size // b + c
+
+        balls = [ball for layout in layouts for ball in layout]
+        return cls(np.array([ball[0] for ball in balls], dtype=np.int8),
+                   np.array([place(ball[1], width) for ball in balls], dtype=float),
+                   np.array([place(ball[2], height) for ball in balls], dtype=float),
+                   np.array([COLOR_NAMES[ball[3]] for ball in balls], dtype=np.uint8).reshape(-1, 3),
+                   np.full(len(balls), 1.0 / fps),
+                   np.cumsum([0] + [len(layout) for layout in layouts]))
+
+    @classmethod
+    def random(cls, width, height, count, seed=None):
+        """
+        count random layouts, drawn as Levels.randomize always drew them:
+        balls of uniform random level, position and color are added until
+        they take RANDOM_LEVEL_TOTAL hits to clear.
+        """
+        rng = np.random.default_rng(seed)
+        shape = (count, RANDOM_LEVEL_TOTAL)
+        x = rng.integers(0, width + 1, size=shape)
+        y = rng.integers(0, height - 200 + 1, size=shape)
+        color = rng.integers(0, len(COLORS), size=shape)
+        level = rng.integers(1, 5, size=shape)
+        cost = LEVEL_COST[level]
+        keep = np.cumsum(cost, axis=1) - cost < RANDOM_LEVEL_TOTAL
+        return cls(level[keep].astype(np.int8), x[keep].astype(float), y[keep].astype(float),
+                   np.array(COLORS, dtype=np.uint8)[color[keep]],
+                   np.full(np.count_nonzero(keep), 1.0 / RANDOM_LEVEL_FPS),
+                   np.concatenate(([0], np.cumsum(keep.sum(axis=1)))))
+
+
+def _bank(key, build):
+    bank = _BANKS.get(key)
+    if bank is None:
+        bank = _BANKS[key] = build()
+
+    return bank
+
 
 class Levels:
-    def __init__(self, width, height, fps):
+    """
+    The fixed levels, read from levels.json, and a bank of random levels
+    generated once from a seed. Banks are shared by every Levels in the
+    process, and loading a level copies its arrays into a BallStore.
+    """
+
+    def __init__(self, width, height, fps, bank_size=4096, seed=0):
+        """
+        :param bank_size: Number of random levels in the bank.
+        :param seed: Seed the bank of random levels is generated from.
+        """
         self.fps = fps
         self.width = width
         self.height = height
         self.b1bounce = self.width / 10
+        self.fixed = _bank(('fixed', width, height, fps),
+                           lambda: LevelBank.from_file(width, height, fps))
+        self.random = _bank(('random', width, height, bank_size, seed),
+                            lambda: LevelBank.random(width, height, bank_size, seed))
+
+    def get(self, lvl, balls=None):
+        """
+        Load one of the fixed levels.
 
-    def get(self, lvl):
-        if lvl == 1:
-            balls = [BallLevel2(self.width // 4, self.height // 4, self.width, self.height, BLUE, self.fps)]
-        elif lvl == 2:
-            balls = [BallLevel3(self.width // 4, self.height // 4, self.width, self.height, GREEN, self.fps)]
-        elif lvl == 3:
-            balls =  [BallLevel4(self.width // 4, self.height // 4, self.width, self.height, RED, self.fps)]
-        elif lvl == 4:
-            balls =  [BallLevel3(self.width // 4, self.height // 4, self.width, self.height, ORANGE, self.fps),
-                    BallLevel3(3 * self.width // 4, self.height // 4, self.width, self.height, ORANGE, self.fps)]
-        elif lvl == 5:
-            balls =  [BallLevel3(self.width // 3, self.height // 4, self.width, self.height, YELLOW, self.fps),
-                    BallLevel4(2*self.width // 3 - 10, self.height // 4, self.width, self.height, GREEN, self.fps)]
-        elif lvl == 6:
-            balls =  [BallLevel1(  self.width // 7, 394, self.width, self.height, PURPLE, self.fps),
-                    BallLevel1(2*self.width // 7, 394, self.width, self.height, PURPLE, self.fps),
-                    BallLevel1(3*self.width // 7, 394, self.width, self.height, PURPLE, self.fps),
-                    BallLevel1(4*self.width // 7, 394, self.width, self.height, PURPLE, self.fps),
-                    BallLevel1(5*self.width // 7, 394, self.width, self.height, PURPLE, self.fps),
-                    BallLevel1(6*self.width // 7, 394, self.width, self.height, PURPLE, self.fps)]
-        elif lvl == 7:
-            balls =  [BallLevel1(  self.width // 7 - 40, 394,  self.width, self.height, RED, self.fps),
-                    BallLevel1(  self.width // 7 - 20, 394,  self.width, self.height, YELLOW, self.fps),
-                    BallLevel1(  self.width // 7,      394,  self.width, self.height, ORANGE, self.fps),
-                    BallLevel1(2*self.width // 7 - 40, 394,  self.width, self.height, RED, self.fps),
-                    BallLevel1(2*self.width // 7 - 20, 394,  self.width, self.height, YELLOW, self.fps),
-                    BallLevel1(2*self.width // 7,      394,  self.width, self.height, ORANGE, self.fps),
-                    BallLevel1(5*self.width // 7 + 10, 394,  self.width, self.height, RED, self.fps),
-                    BallLevel1(5*self.width // 7 + 30, 394,  self.width, self.height, YELLOW, self.fps),
-                    BallLevel1(5*self.width // 7 + 50, 394,  self.width, self.height, ORANGE, self.fps),
-                    BallLevel1(6*self.width // 7 + 10, 394,  self.width, self.height, RED, self.fps),
-                    BallLevel1(6*self.width // 7 + 30, 394,  self.width, self.height, YELLOW, self.fps),
-                    BallLevel1(6*self.width // 7 + 50, 394,  self.width, self.height, ORANGE, self.fps)]
-        else:
+        :param balls: A BallStore to load the level into, replacing its balls.
+                      A new one is created if not given.
+        :return: The BallStore holding the level's balls.
+        """
+        if not 1 <= lvl <= len(self.fixed):
             raise ValueError("No further levels have been implemented.")
 
-        return pygame.sprite.Group(balls)
-
-    def randomize(self):
-        r = random.Random()
-        total = 0
-        balls = []
-        while total < 20:
-            x = r.randint(0, self.width)
-            y = r.randint(0, self.height - 200)
-            c = r.choice(COLORS)
-            lvl = r.randint(1,4)
-            if lvl == 1:
-                balls.append(BallLevel1(x, y, self.width, self.height, c))
-                total += 1
-            elif lvl == 2:
-                balls.append(BallLevel2(x, y, self.width, self.height, c))
-                total += 3
-            elif lvl == 3:
-                balls.append(BallLevel3(x, y, self.width, self.height, c))
-                total += 7
-            elif lvl == 4:
-                balls.append(BallLevel4(x, y, self.width, self.height, c))
-                total += 15
-
-        return pygame.sprite.Group(balls)
+        return self.fixed.load(lvl - 1, self._store(balls))
+
+    def randomize(self, balls=None, rng=None):
+        """
+        Load a level of random balls adding up to at least 20 hits, chosen
+        from the bank.
+
+        :param balls: A BallStore to load the level into, replacing its balls.
+                      A new one is created if not given.
+        :param rng: The numpy Generator choosing the level. An unseeded one
+                    is used if not given.
+        :return: The BallStore holding the level's balls.
+        """
+        if rng is None:
+            rng = np.random.default_rng()
+
+        return self.random.load(rng.integers(len(self.random)), self._store(balls))
 
+    def _store(self, balls):
+        if balls is None:
+            balls = BallStore(self.width, self.height)
 
+        return balls
@@ -0,0 +1,164 @@
+"""
+Append-only columnar store of the per-iteration results of a training run,
+kept next to its checkpoints in Results/<name>_v<N>/.
+
+Results are buffered and written every flush_every iterations as one Arrow
+file under metrics/, and checkpoints are indexed by iteration under
+checkpoints/ as they are saved. Nothing is ever rewritten: loading reads
+every file at once, and rows written for an iteration supersede every row
+previously written for that iteration or later ones (checkpoints only
+supersede later ones), so a run resumed from an earlier checkpoint simply
+carries on appending.
+"""
+import math
+import os
+import re
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.feather as feather
+
+METRICS_SCHEMA = pa.schema([
+    ('iteration', pa.int64()),
+    ('episode_reward_mean', pa.float64()),
+    ('episode_reward_min', pa.float64()),
+    ('episode_reward_max', pa.float64()),
+    ('episode_len_mean', pa.float64()),
+    ('episodes_this_iter', pa.int64()),
+    ('time_this_iter_s', pa.float64()),
+    ('time_total_s', pa.float64()),
+    ('episode_rewards', pa.list_(pa.float64())),
+    ('episode_lengths', pa.list_(pa.int64())),
+])
+CHECKPOINTS_SCHEMA = pa.schema([
+    ('iteration', pa.int64()),
+    ('path', pa.string()),
+    ('episode_reward_mean', pa.float64()),
+    ('best', pa.bool_()),
+])
+CHECKPOINT_DIR = re.compile(r"checkpoint-(\d+)$")
+
+
+def _nan(value):
+    return math.nan if value is None else float(value)
+
+
+class MetricsStore:
+
+    def __init__(self, path, flush_every=100):
+        """
+        :param path: The run's results directory.
+        :param flush_every: Number of iterations buffered before they are
+                            written.
+        """
+        self.path = path
+        self.flush_every = flush_every
+        self.rows = []
+        for folder in ('metrics', 'checkpoints'):
+            os.makedirs(os.path.join(path, folder), exist_ok=True)
+
+    def append(self, iteration, result):
+        """
+        Buffer an iteration's results.
+
+        :param result: The dict returned by Algorithm.train().
+        """
+        hist = result.get('hist_stats', {})
+        self.rows.append({
+            'iteration': iteration,
+            'episode_reward_mean': _nan(result.get('episode_reward_mean')),
+            'episode_reward_min': _nan(result.get('episode_reward_min')),
+            'episode_reward_max': _nan(result.get('episode_reward_max')),
+            'episode_len_mean': _nan(result.get('episode_len_mean')),
+            'episodes_this_iter': int(result.get('episodes_this_iter', 0)),
+            'time_this_iter_s': _nan(result.get('time_this_iter_s')),
+            'time_total_s': _nan(result.get('time_total_s')),
+            'episode_rewards': [float(x) for x in hist.get('episode_reward', [])],
+            'episode_lengths': [int(x) for x in hist.get('episode_lengths', [])],
+        })
+        if len(self.rows) >= self.flush_every:
+            self.flush()
+
+    def add_checkpoint(self, iteration, path, reward, best=True):
+        """
+        Index a checkpoint saved at an iteration. Buffered results are
+        written first, so the index never runs ahead of them.
+
+        :param best: False for checkpoints saved periodically rather than for
+                     a new best mean reward.
+        """
+        self.flush()
+        table = pa.Table.from_pylist([{'iteration': iteration, 'path': str(path),
+                                       'episode_reward_mean': _nan(reward), 'best': best}],
+                                     schema=CHECKPOINTS_SCHEMA)
+        self._write('checkpoints', table)
+
+    def flush(self):
+        if self.rows:
+            self._write('metrics', pa.Table.from_pylist(self.rows, schema=METRICS_SCHEMA))
+            self.rows = []
+
+    def close(self):
+        self.flush()
+
+    def load(self):
+        """Every iteration's results, as one pyarrow Table sorted by iteration."""
+        return self._read('metrics', METRICS_SCHEMA, self.rows)
+
+    def checkpoints(self):
+        """The checkpoint index, as a pyarrow Table sorted by iteration."""
+        return self._read('checkpoints', CHECKPOINTS_SCHEMA, same_iteration=True)
+
+    def import_rewards_txt(self):
+        """
+        Convert a run logged in the older format: the comma-separated mean
+        rewards of rewards.txt (one per iteration, from 1) and the
+        checkpoint-NNNNNN directories next to it. Does nothing if the store
+        already holds results.
+
+        :return: The number of iterations imported.
+        """
+        filename = os.path.join(self.path, 'rewards.txt')
+        if self.load().num_rows or not os.path.exists(filename):
+            return 0
+
+        with open(filename) as f:
+            rewards = [float(x) for x in f.read().split(",") if x]
+        for i, reward in enumerate(rewards, start=1):
+            self.rows.append({'iteration': i, 'episode_reward_mean': reward})
+        self.flush()
+
+        for name in sorted(os.listdir(self.path)):
+            match = CHECKPOINT_DIR.match(name)
+            if match:
+                i = int(match.group(1))
+                reward = rewards[i - 1] if i <= len(rewards) else None
+                self.add_checkpoint(i, os.path.join(self.path, name), reward)
+
+        return len(rewards)
+
+    def _write(self, folder, table):
+        # Files are numbered in the order they are written.
+        directory = os.path.join(self.path, folder)
+        index = len(os.listdir(directory))
+        filename = os.path.join(directory, f"{index:08d}.arrow")
+        feather.write_feather(table, filename + ".tmp", compression='uncompressed')
+        os.replace(filename + ".tmp", filename)
+
+    def _read(self, folder, schema, rows=(), same_iteration=False):
+        directory = os.path.join(self.path, folder)
+        tables = [feather.read_table(os.path.join(directory, name))
+                  for name in sorted(os.listdir(directory)) if name.endswith(".arrow")]
+        if rows:
+            tables.append(pa.Table.from_pylist(rows, schema=schema))
+        if not tables:
+            return schema.empty_table()
+
+        table = pa.concat_tables(tables)
+        # A row is superseded by any row written after it for an earlier
+        # iteration, or for the same one unless same_iteration is set.
+        iterations = table.column('iteration').to_numpy()
+        later = np.minimum.accumulate(iterations[::-1])[::-1]
+        later = np.append(later[1:], np.iinfo(np.int64).max)
+        keep = np.flatnonzero(iterations <= later if same_iteration else iterations < later)
+        return table.take(keep[np.argsort(iterations[keep], kind='stable')])
@@ -0,0 +1,132 @@
+import numpy as np
+
+from ball import BALL_CLASSES
+
+
+def ball_tables(width, height):
+    """
+    Per-class ball constants, indexed by ball level (index 0 is unused).
+
+    :return: A tuple of float64 arrays (radius, max_yspeed, yacc).
+    """
+    radius = np.zeros(len(BALL_CLASSES))
+    max_yspeed = np.zeros(len(BALL_CLASSES))
+    yacc = np.zeros(len(BALL_CLASSES))
+    for level, cls in enumerate(BALL_CLASSES):
+        if cls is not None:
+            radius[level], max_yspeed[level], yacc[level] = cls.load_properties(height, width)
+
+    return radius, max_yspeed, yacc
+
+
+def ball_xspeed(width):
+    """Horizontal speed every ball is spawned with."""
+    return width / 9.4
+
+
+def agent_size(width):
+    """Size of the scaled agent sprite, as computed by Agent.load."""
+    return int(30 / 720 * width), int(47 / 720 * width)
+
+
+def agent_speed(width, fps):
+    return width / fps / 5.13
+
+
+# Opaque bounds (left, top, width, height) of each agent sprite as fractions
+# of the sprite's size, indexed by action (LEFT, RIGHT, SHOOT, STILL).
+AGENT_HITBOXES = np.array([
+    (4 / 29, 2 / 41, 23 / 29, 37 / 41),  # Sprites/left.png
+    (2 / 29, 2 / 41, 23 / 29, 37 / 41),  # Sprites/right.png
+    (6 / 28, 4 / 40, 17 / 28, 34 / 40),  # Sprites/still.png
+    (6 / 28, 4 / 40, 17 / 28, 34 / 40),  # Sprites/still.png
+])
+
+
+def agent_hitboxes(width):
+    """
+    Agent hitboxes in pixels, relative to the agent's rect, indexed by action.
+
+    :return: A tuple of arrays (left, top, width, height).
+    """
+    sprite_width, sprite_height = agent_size(width)
+    return tuple(AGENT_HITBOXES[:, i] * size for i, size in
+                 enumerate((sprite_width, sprite_height, sprite_width, sprite_height)))
+
+
+def round_half_away(values):
+    """Round the way pygame.Rect rounds floats assigned to its attributes."""
+    return np.trunc(values + np.copysign(0.5, values))
+
+
+def update_lasers(active, length, speed, agent_height, height):
+    """Advance every laser by one frame in place, mirroring Laser.update."""
+    was_active = active.copy()
+    topped = active & (length >= height)
+    active &= ~topped
+    length[topped] = agent_height
+    np.minimum(length + speed, height, out=length, where=was_active)
+
+
+def laser_collides(laser_active, laser_x, laser_length,
+                   ball_active, center_x, center_y, radius, height):
+    """
+    Whether each laser overlaps each ball. Laser arrays must broadcast against
+    the ball arrays (e.g. shape (n, 1) against (n, capacity)).
+    """
+    top = height - laser_length
+    return (laser_active & ball_active
+            & (center_y + radius > top)
+            & (center_x + radius >= laser_x)
+            & (center_x - radius <= laser_x)
+            & (center_y - radius < height))
+
+
+def step_agents(agent_x, laser_active, laser_x, left, right, shoot,
+                speed, agent_width, width):
+    """
+    Vectorized Agent.step for boolean action masks. Updates the agents' rect x
+    in place and fires inactive lasers from the agents' centers.
+    """
+    moved = np.where(left, np.maximum(0, round_half_away(agent_x - speed)), agent_x)
+    moved = np.where(right, np.minimum(width - agent_width, round_half_away(agent_x + speed)), moved)
+    agent_x[:] = moved
+    fire = shoot & ~laser_active
+    laser_x[fire] = agent_x[fire] + agent_width // 2
+    laser_active |= fire
+
+
+def agent_collides(agent_x, agent_y, agent_width, agent_height,
+                   ball_active, center_x, center_y, radius):
+    """
+    Circle-vs-rect test between every ball and its agent's hitbox. Agent
+    arrays must broadcast against the ball arrays.
+    """
+    nearest_x = np.clip(center_x, agent_x, agent_x + agent_width)
+    nearest_y = np.clip(center_y, agent_y, agent_y + agent_height)
+    dx = center_x - nearest_x
+    dy = center_y - nearest_y
+    return ball_active & (dx * dx + dy * dy < radius * radius)
+
+
+def agent_capsule_collides(agent_x, agent_y, agent_width, agent_height,
+                           ball_active, center_x, center_y, radius):
+    """
+    Circle-vs-capsule test between every ball and its agent's hitbox, taken
+    as the vertical capsule (a segment swept by a circle) inscribed in it.
+    Agent arrays must broadcast against the ball arrays.
+    """
+    cap = agent_width / 2
+    top = agent_y + cap
+    bottom = np.maximum(top, agent_y + agent_height - cap)
+    dx = center_x - (agent_x + cap)
+    dy = center_y - np.clip(center_y, top, bottom)
+    reach = radius + cap
+    return ball_active & (dx * dx + dy * dy < reach * reach)
+
+
+# Geometric agent-vs-ball tests, by the name used for them in env configs.
+AGENT_COLLISIONS = {
+    'rect': agent_collides,
+    'capsule': agent_capsule_collides,
+}
@@ -0,0 +1,172 @@
+"""
+Policies playing a Game without a learner: act(game, observation) returns
+the action to step the game with.
+
+play_episode, play and play_clients are the episode loops shared by the
+scripts that play policies (evaluate.py, inference_server.py and
+generate_dataset.py).
+"""
+import multiprocessing as mp
+import queue
+
+import numpy as np
+
+from expert import Expert
+from games import GAMES
+
+
+class RandomPolicy:
+    """Uniformly random actions from a seeded generator."""
+
+    def __init__(self, seed=None):
+        self.rng = np.random.default_rng(seed)
+
+    def act(self, game, observation):
+        return int(self.rng.integers(4))
+
+
+class ScriptedPolicy:
+    """Moves under the nearest ball and shoots once it is under it."""
+
+    def act(self, game, observation):
+        agent = game.agent
+        offset = game.nearest_ball()
+        if abs(offset) <= agent.speed:
+            return 3 if agent.laser.active else 2
+        return 1 if offset > 0 else 0
+
+
+class ExpertPolicy:
+    """The scripted expert of expert.py, built for the first game it plays."""
+
+    def __init__(self):
+        self.expert = None
+
+    def act(self, game, observation):
+        if self.expert is None:
+            self.expert = Expert(game.width, game.height, game.fps, game.collision)
+        return int(self.expert.game_actions([game])[0])
+
+
+class CheckpointPolicy:
+    """Greedy actions of an RLlib module restored from a checkpoint."""
+
+    def __init__(self, path):
+        from inference_server import load_module
+        self.forward = load_module(path)
+
+    def act(self, game, observation):
+        return int(self.forward(observation[None])[0])
+
+
+def make_policy(name, seed=None, checkpoint=None):
+    """
+    :param name: 'random', 'scripted', 'expert' or 'checkpoint'.
+    :param seed: Seed of the random policy.
+    :param checkpoint: Path of the checkpoint policy's checkpoint.
+    """
+    if name == 'random':
+        return RandomPolicy(seed)
+    if name == 'scripted':
+        return ScriptedPolicy()
+    if name == 'expert':
+        return ExpertPolicy()
+    if name == 'checkpoint':
+        if not checkpoint:
+            raise ValueError("The checkpoint policy needs a checkpoint.")
+        return CheckpointPolicy(checkpoint)
+
+    raise ValueError(f"Unknown policy: {name}")
+
+
+def play_episode(policy, game, observation, max_steps=None, record=None):
+    """
+    Play a reset game with a policy until its episode ends or lasts max_steps.
+
+    :param observation: The observation the game was reset to.
+    :param record: Called as record(observation, action, reward, terminated,
+                   truncated) after every step, with the observation acted on.
+    :return: A tuple (observation, return, steps, terminated, truncated,
+             totals) with the last observation and the totals of the terms
+             the game logs (see Game's log_rewards), unweighted.
+    """
+    totals = dict.fromkeys(game.log_rewards, 0.0)
+    total, steps = 0.0, 0
+    terminated = truncated = False
+    while not (terminated or truncated) and (max_steps is None or steps < max_steps):
+        action = policy.act(game, observation)
+        if record is not None and not game.copy_obs:
+            # The step overwrites the observation acted on in place.
+            observation = observation.copy()
+        next_observation, reward, terminated, truncated, info = game.step(action)
+        if record is not None:
+            record(observation, action, reward, terminated, truncated)
+        observation = next_observation
+        total += reward
+        steps += 1
+        for name in totals:
+            totals[name] += info[name]
+
+    return observation, total, steps, terminated, truncated, totals
+
+
+def play(policy, game, episodes, max_steps=None):
+    """
+    Play episodes with a policy, each until it ends or lasts max_steps.
+
+    :param policy: A policy, or a function of an episode's seed returning one.
+    :param episodes: (seed, level) pairs, level 0 for a random level.
+    :return: One summary dict per episode, with the totals of the terms the
+             game logs, both raw ('raw') and weighted ('terms').
+    """
+    summaries = []
+    for seed, level in episodes:
+        actor = policy(seed) if callable(policy) else policy
+        observation, _ = game.reset(seed=seed, options={'level': level} if level else None)
+        _, total, steps, terminated, truncated, totals = play_episode(actor, game, observation,
+                                                                      max_steps)
+        summaries.append({'seed': seed, 'level': level, 'return': total, 'length': steps,
+                          'cleared': int(truncated), 'died': int(terminated),
+                          'raw': totals,
+                          'terms': {name: game.rewards[name] * value
+                                    for name, value in totals.items()}})
+
+    return summaries
+
+
+def _play_client(client, game_name, env_config, episodes, max_steps, results):
+    game = GAMES[game_name](dict(env_config, render_mode=None))
+    results.put(play(client, game, episodes, max_steps))
+    game.close()
+
+
+def play_clients(server, game_name, env_config, episodes, max_steps=None):
+    """
+    Play episodes with the clients of a started InferenceServer, spread over
+    one process per client.
+
+    :param episodes: (seed, level) pairs, as for play.
+    :return: The episodes' summaries, by seed.
+    """
+    ctx = mp.get_context()
+    results = ctx.Queue()
+    shares = [episodes[slot::server.clients] for slot in range(server.clients)]
+    processes = [ctx.Process(target=_play_client, daemon=True,
+                             args=(server.client(slot), game_name, env_config, share, max_steps,
+                                   results))
+                 for slot, share in enumerate(shares) if share]
+    for process in processes:
+        process.start()
+
+    summaries = []
+    while len(summaries) < len(episodes):
+        try:
+            summaries.extend(results.get(timeout=1))
+        except queue.Empty:
+            if not any(process.is_alive() for process in processes):
+                server.close()
+                raise RuntimeError("Episode processes exited before playing every episode.")
+    for process in processes:
+        process.join()
+
+    return sorted(summaries, key=lambda summary: summary['seed'])
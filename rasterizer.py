@@ -0,0 +1,129 @@
+import numpy as np
+
+from ball import BLUE, GREEN, RED, YELLOW
+
+# Ball colors by level (index 0 is unused), following the colors balls take
+# when they split, so that a ball's size and color agree in every game.
+LEVEL_COLORS = np.array([(0, 0, 0), YELLOW, BLUE, GREEN, RED], dtype=np.uint8)
+AGENT_COLOR = (200, 200, 200)
+LASER_COLOR = (255, 0, 0)
+# ITU-R 601 luma weights, for grayscale frames.
+LUMA = np.array([0.299, 0.587, 0.114])
+
+
+class Rasterizer:
+    """
+    Draws the balls, agents and lasers of a batch of games straight into a
+    uint8 array, at a lower resolution than the display.
+
+    Every shape of every game is drawn at once with NumPy: balls as filled
+    circles sampled at pixel centers (never thinner than one pixel), and the
+    agent's hitbox and the laser as rects covering every pixel they touch.
+    Shapes are drawn in Game._render_frame's order: laser, agent, balls.
+    """
+
+    def __init__(self, width, height, resolution=(120, 64), channels=3):
+        """
+        :param width: Width of the display, in game coordinates.
+        :param height: Height of the display, in game coordinates.
+        :param resolution: (width, height) of the frames, in pixels.
+        :param channels: 3 for RGB frames, 1 for grayscale.
+        """
+        if channels not in (1, 3):
+            raise ValueError("channels must be 1 (grayscale) or 3 (RGB).")
+
+        self.width = width
+        self.height = height
+        self.resolution = tuple(resolution)
+        self.channels = channels
+        self.shape = (resolution[1], resolution[0], channels)
+        # Size of a pixel, in game coordinates.
+        self.pixel_width = width / resolution[0]
+        self.pixel_height = height / resolution[1]
+        self.level_colors = self.color(LEVEL_COLORS)
+        self.agent_color = self.color(AGENT_COLOR)
+        self.laser_color = self.color(LASER_COLOR)
+
+    def color(self, rgb):
+        """Convert RGB colors to the frames' channels."""
+        rgb = np.asarray(rgb, dtype=np.uint8)
+        if self.channels == 3:
+            return rgb
+
+        return np.round(rgb @ LUMA).astype(np.uint8)[..., None]
+
+    def frames(self, count):
+        """A zeroed array for count frames."""
+        return np.zeros((count,) + self.shape, dtype=np.uint8)
+
+    def draw(self, out, rows, ball_active, ball_level, center_x, center_y, radius,
+             agent_rects, laser_active, laser_x, laser_length, laser_width):
+        """
+        Draw one frame per game into out[rows].
+
+        :param out: A uint8 array of frames, as returned by frames().
+        :param rows: The frame of each game, an int array of length n.
+        :param ball_active: (n, c) array, True for the ball slots in play.
+        :param ball_level: (n, c) array of ball levels.
+        :param center_x: (n, c) array of ball centers.
+        :param center_y: (n, c) array of ball centers.
+        :param radius: (n, c) array of ball radii.
+        :param agent_rects: A tuple (left, top, width, height) of (n,) arrays.
+        :param laser_active: (n,) array, True where the laser is fired.
+        :param laser_x: (n,) array of laser positions.
+        :param laser_length: (n,) array of laser lengths.
+        :param laser_width: Width of the lasers.
+        :return: out
+        """
+        out[rows] = 0
+
+        laser = np.flatnonzero(laser_active)
+        self._fill_rects(out, rows[laser], laser_x[laser], self.height - laser_length[laser],
+                         np.full(len(laser), laser_width), laser_length[laser], self.laser_color)
+        self._fill_rects(out, rows, *agent_rects, self.agent_color)
+
+        envs, slots = np.nonzero(ball_active)
+        if len(envs):
+            self._fill_circles(out, rows[envs], center_x[envs, slots], center_y[envs, slots],
+                               radius[envs, slots], self.level_colors[ball_level[envs, slots]])
+
+        return out
+
+    def _fill_rects(self, out, rows, left, top, width, height, color):
+        """Fill every pixel touched by each rect."""
+        if len(rows) == 0:
+            return
+
+        rx, ry = self.resolution
+        x0 = np.clip(np.floor(left / self.pixel_width), 0, rx).astype(int)
+        x1 = np.clip(np.ceil((left + width) / self.pixel_width), 0, rx).astype(int)
+        y0 = np.clip(np.floor(top / self.pixel_height), 0, ry).astype(int)
+        y1 = np.clip(np.ceil((top + height) / self.pixel_height), 0, ry).astype(int)
+        columns = np.arange(rx)
+        lines = np.arange(ry)
+        inside = (((lines >= y0[:, None]) & (lines < y1[:, None]))[:, :, None]
+                  & ((columns >= x0[:, None]) & (columns < x1[:, None]))[:, None, :])
+        shapes, ys, xs = np.nonzero(inside)
+        out[rows[shapes], ys, xs] = color
+
+    def _fill_circles(self, out, rows, center_x, center_y, radius, colors):
+        """Fill the pixels whose centers are inside each circle."""
+        # Radii in pixels, at least half a pixel diagonal so that a ball
+        # always covers a pixel center.
+        rx = np.maximum(radius / self.pixel_width, np.sqrt(0.5))
+        ry = np.maximum(radius / self.pixel_height, np.sqrt(0.5))
+        # Every circle is tested on a patch of pixels around its center, as
+        # large as the largest circle's bounding box.
+        patch_x = np.arange(int(np.ceil(2 * rx.max())) + 2)
+        patch_y = np.arange(int(np.ceil(2 * ry.max())) + 2)
+        px = center_x / self.pixel_width
+        py = center_y / self.pixel_height
+        xs = np.floor(px - rx).astype(int)[:, None] + patch_x
+        ys = np.floor(py - ry).astype(int)[:, None] + patch_y
+        dx = (xs + 0.5 - px[:, None]) / rx[:, None]
+        dy = (ys + 0.5 - py[:, None]) / ry[:, None]
+        inside = (dy ** 2)[:, :, None] + (dx ** 2)[:, None, :] <= 1
+        inside &= ((ys >= 0) & (ys < self.resolution[1]))[:, :, None]
+        inside &= ((xs >= 0) & (xs < self.resolution[0]))[:, None, :]
+        shapes, i, j = np.nonzero(inside)
+        out[rows[shapes], ys[shapes, i], xs[shapes, j]] = colors[shapes]
@@ -0,0 +1,209 @@
+"""
+Compact episode recordings: the seed and level an episode was reset with
+and one byte per action, from which replay() re-steps the game to rebuild
+every observation exactly. Observations can also be sampled every few
+steps, and rewards (with the game's logged reward terms) kept per step.
+
+A recorder writes into a directory:
+
+- <run>.json: the game's class and config, and the recordings' layout;
+- <run>-NNNNNN.bin: chunks of chunk_episodes episodes, each written once.
+
+An episode is stored as an int64 header (seed, level, steps, observe_every,
+number of observations, number of reward columns, history bytes), then the
+uint8 actions, the float64 reward columns (column-major), the sampled
+observations and, for the lookback games, their frame history from before
+the reset (which the first observations of an episode include).
+"""
+import glob
+import json
+import os
+import uuid
+
+import numpy as np
+
+HEADER = 7
+
+
+class Episode:
+
+    def __init__(self, game, config, seed, level, actions, observe_every, observations, rewards,
+                 history=None):
+        """
+        :param observations: Observations after reset and after every
+                             observe_every-th step, if observe_every is set.
+        :param rewards: Dict of per-step reward columns.
+        :param history: The game's FrameHistory state before the reset, if
+                        it has one.
+        """
+        self.game = game
+        self.config = config
+        self.seed = seed
+        self.level = level
+        self.actions = actions
+        self.observe_every = observe_every
+        self.observations = observations
+        self.rewards = rewards
+        self.history = history
+
+    def __len__(self):
+        return len(self.actions)
+
+
+class EpisodeRecorder:
+
+    def __init__(self, directory, game, config, observation_space, reward_columns=(),
+                 observe_every=0, chunk_episodes=64):
+        """
+        :param game: Name of the game's class (see games.GAMES).
+        :param config: The game's config, as JSON.
+        :param reward_columns: Names of the reward columns recorded every
+                               step: 'reward' for the step's reward, or the
+                               name of a term the game logs in its info.
+        :param observe_every: Record every observe_every-th observation (0
+                              for none).
+        """
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.run = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self.reward_columns = tuple(reward_columns)
+        self.observe_every = observe_every
+        self.chunk_episodes = chunk_episodes
+        self.chunks = 0
+        self.episodes = []
+        self.current = None
+        with open(os.path.join(directory, self.run + ".json"), 'w') as f:
+            json.dump({'game': game, 'config': config,
+                       'observation_shape': list(observation_space.shape),
+                       'observation_dtype': np.dtype(observation_space.dtype).str,
+                       'reward_columns': list(self.reward_columns)}, f)
+
+    def start(self, seed, level, observation, history=None):
+        """
+        Start recording an episode reset with seed (and level, 0 if random).
+
+        :param history: The game's FrameHistory state from before the reset.
+        """
+        self.end()
+        self.current = {'seed': seed, 'level': level, 'actions': [],
+                        'history': b"" if history is None else history.tobytes(),
+                        'observations': [observation.copy()] if self.observe_every else [],
+                        'rewards': [[] for _ in self.reward_columns]}
+
+    def record(self, action, observation, reward, info):
+        episode = self.current
+        if episode is None:
+            return
+
+        episode['actions'].append(action)
+        if self.observe_every and len(episode['actions']) % self.observe_every == 0:
+            episode['observations'].append(observation.copy())
+        for column, name in zip(episode['rewards'], self.reward_columns):
+            column.append(reward if name == 'reward' else info[name])
+
+    def end(self):
+        """Finish the current episode, writing a chunk if it completes one."""
+        if self.current is None:
+            return
+
+        episode, self.current = self.current, None
+        steps = len(episode['actions'])
+        header = np.array([episode['seed'], episode['level'], steps, self.observe_every,
+                           len(episode['observations']), len(self.reward_columns),
+                           len(episode['history'])], dtype=np.int64)
+        parts = [header.tobytes(), np.array(episode['actions'], dtype=np.uint8).tobytes(),
+                 np.array(episode['rewards'], dtype=np.float64).reshape(-1).tobytes()]
+        if episode['observations']:
+            parts.append(np.stack(episode['observations']).tobytes())
+        parts.append(episode['history'])
+        self.episodes.append(b"".join(parts))
+        if len(self.episodes) >= self.chunk_episodes:
+            self.flush()
+
+    def flush(self):
+        if not self.episodes:
+            return
+
+        filename = os.path.join(self.directory, f"{self.run}-{self.chunks:06d}.bin")
+        with open(filename + ".tmp", 'wb') as f:
+            f.write(b"".join(self.episodes))
+        os.replace(filename + ".tmp", filename)
+        self.chunks += 1
+        self.episodes = []
+
+    def close(self):
+        self.end()
+        self.flush()
+
+
+def read_episodes(directory):
+    """Every episode recorded in a directory, as Episodes, chunk by chunk."""
+    episodes = []
+    for manifest_file in sorted(glob.glob(os.path.join(directory, "*.json"))):
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+        shape = tuple(manifest['observation_shape'])
+        dtype = np.dtype(manifest['observation_dtype'])
+        columns = manifest['reward_columns']
+        for chunk in sorted(glob.glob(manifest_file[:-len(".json")] + "-*.bin")):
+            data = np.fromfile(chunk, dtype=np.uint8)
+            offset = 0
+            while offset < len(data):
+                seed, level, steps, observe_every, count, _, history = \
+                    data[offset:offset + 8 * HEADER].view(np.int64)
+                offset += 8 * HEADER
+                actions = data[offset:offset + steps]
+                offset += steps
+                size = 8 * steps * len(columns)
+                rewards = data[offset:offset + size].view(np.float64).reshape(len(columns), steps)
+                offset += size
+                size = count * int(np.prod(shape)) * dtype.itemsize
+                observations = data[offset:offset + size].view(dtype).reshape((count,) + shape)
+                offset += size
+                state = data[offset:offset + history] if history else None
+                offset += history
+                episodes.append(Episode(manifest['game'], manifest['config'], int(seed), int(level),
+                                        actions, int(observe_every), observations,
+                                        dict(zip(columns, rewards)), state))
+
+    return episodes
+
+
+def replay(episode, verify=True):
+    """
+    Rebuild an episode by resetting a new game as it was reset and stepping
+    it with the recorded actions.
+
+    :param verify: Raise a RuntimeError if a recorded observation or reward
+                   differs from the replayed one.
+    :return: A tuple (observations, rewards): every observation, from the
+             reset on, stacked, and the reward of every step.
+    """
+    # Imported here, as games imports the game classes that import this.
+    from games import GAMES
+    game = GAMES[episode.game](dict(episode.config, render_mode=None, record_dir=None))
+    if episode.history is not None:
+        game.history.set_state(episode.history)
+    options = {'level': episode.level} if episode.level else None
+    observation, _ = game.reset(seed=episode.seed, options=options)
+    observations = [observation.copy()]
+    rewards = np.zeros(len(episode))
+    infos = []
+    for i, action in enumerate(episode.actions):
+        observation, rewards[i], _, _, info = game.step(int(action))
+        observations.append(observation.copy())
+        infos.append(info)
+    game.close()
+
+    observations = np.stack(observations)
+    if verify:
+        if episode.observe_every:
+            sampled = observations[::episode.observe_every][:len(episode.observations)]
+            if not np.array_equal(sampled, episode.observations):
+                raise RuntimeError("Replayed observations differ from the recorded ones.")
+        for name, column in episode.rewards.items():
+            values = rewards if name == 'reward' else [info[name] for info in infos]
+            if not np.array_equal(values, column):
+                raise RuntimeError(f"Replayed {name} rewards differ from the recorded ones.")
+
+    return observations, rewards
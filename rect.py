@@ -0,0 +1,67 @@
+import math
+
+
+def _round(value):
+    """Round the way pygame.Rect rounds floats assigned to its attributes."""
+    return int(value + math.copysign(0.5, value))
+
+
+class Rect:
+    """
+    The part of pygame.Rect the agent uses, with the same integer rounding,
+    so that games which never render do not need to import pygame.
+    """
+
+    def __init__(self, x, y, width, height):
+        # pygame.Rect truncates the values it is constructed with.
+        self._x = int(x)
+        self._y = int(y)
+        self.width = int(width)
+        self.height = int(height)
+
+    @property
+    def x(self):
+        return self._x
+
+    @x.setter
+    def x(self, value):
+        self._x = _round(value)
+
+    @property
+    def y(self):
+        return self._y
+
+    @y.setter
+    def y(self, value):
+        self._y = _round(value)
+
+    left = x
+    top = y
+
+    @property
+    def right(self):
+        return self._x + self.width
+
+    @property
+    def bottom(self):
+        return self._y + self.height
+
+    @property
+    def centerx(self):
+        return self._x + self.width // 2
+
+    @centerx.setter
+    def centerx(self, value):
+        self._x = _round(value) - self.width // 2
+
+    @property
+    def midbottom(self):
+        return self.centerx, self.bottom
+
+    @midbottom.setter
+    def midbottom(self, value):
+        self.centerx = value[0]
+        self._y = _round(value[1]) - self.height
+
+    def __repr__(self):
+        return f"<rect({self._x}, {self._y}, {self.width}, {self.height})>"
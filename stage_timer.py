@@ -0,0 +1,39 @@
+from time import perf_counter
+
+
+class StageTimer:
+    """
+    Accumulated wall time and call counts of the stages of a step.
+
+    start() marks the beginning of a stage and lap(stage) charges the time
+    since the last start() or lap() to that stage, so consecutive stages
+    cost one clock read each.
+    """
+
+    def __init__(self, stages):
+        self.stages = tuple(stages)
+        self.last = 0.0
+        self.reset()
+
+    def reset(self):
+        self.totals = dict.fromkeys(self.stages, 0.0)
+        self.counts = dict.fromkeys(self.stages, 0)
+
+    def start(self):
+        self.last = perf_counter()
+
+    def lap(self, stage):
+        now = perf_counter()
+        self.totals[stage] += now - self.last
+        self.counts[stage] += 1
+        self.last = now
+
+    def stats(self):
+        """
+        :return: A dict mapping every stage to its total time in seconds,
+                 number of calls and mean time per call in microseconds.
+        """
+        return {stage: {'total_s': self.totals[stage],
+                        'calls': self.counts[stage],
+                        'mean_us': 1e6 * self.totals[stage] / max(self.counts[stage], 1)}
+                for stage in self.stages}
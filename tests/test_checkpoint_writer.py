@@ -0,0 +1,77 @@
+import os
+
+import pytest
+
+from checkpoint_writer import CheckpointWriter, checkpoint_name
+from metrics_store import MetricsStore
+
+
+def fake_save(path):
+    with open(os.path.join(path, "weights"), 'w') as f:
+        f.write(path)
+
+
+def checkpoints(directory):
+    return sorted(name for name in os.listdir(directory) if name.startswith("checkpoint-"))
+
+
+def test_retention_spans_resumes(tmp_path):
+    directory = str(tmp_path)
+    store = MetricsStore(directory)
+    rewards = {1: 5.0, 2: 1.0, 3: 2.0, 4: 3.0, 5: 0.0}
+    writer = CheckpointWriter(directory, keep_best=1, keep_last=1, store=store)
+    for iteration, reward in rewards.items():
+        writer.save(iteration, reward, fake_save)
+    writer.close()
+    writer.index(store)
+    assert checkpoints(directory) == [checkpoint_name(1), checkpoint_name(5)]
+
+    # Resumed: the checkpoints of the first run count towards retention.
+    writer = CheckpointWriter(directory, keep_best=1, keep_last=1, store=store)
+    writer.save(6, 4.0, fake_save)
+    writer.save(7, 6.0, fake_save)
+    writer.close()
+    assert checkpoints(directory) == [checkpoint_name(7)]
+    assert not os.listdir(os.path.join(directory, ".staging"))
+
+
+def test_saves_restorable_rllib_checkpoints(tmp_path):
+    pytest.importorskip("torch")
+    pytest.importorskip("ray.rllib")
+    from ray.rllib.algorithms.algorithm import Algorithm
+    from ray.rllib.algorithms.ppo import PPOConfig
+    from ray.rllib.policy.sample_batch import DEFAULT_POLICY_ID
+
+    from game import Game
+
+    config = (
+        PPOConfig()
+        .experimental(_enable_new_api_stack=True, _disable_preprocessor_api=True)
+        .framework("torch")
+        .rollouts(num_rollout_workers=0, rollout_fragment_length=50)
+        .environment(Game, env_config={'render_mode': None})
+        .training(model={"fcnet_hiddens": [32, 32]}, train_batch_size=100, sgd_minibatch_size=50,
+                  num_sgd_iter=1)
+    )
+    algorithm = config.build()
+    writer = CheckpointWriter(str(tmp_path))
+    for iteration in (1, 2):
+        result = algorithm.train()
+        writer.save(iteration, result['episode_reward_mean'],
+                    lambda path: algorithm.save(checkpoint_dir=path))
+    weights = {name: value.copy()
+               for name, value in algorithm.learner_group.get_weights()[DEFAULT_POLICY_ID].items()}
+    writer.close()
+    path = writer.written()[-1][1]
+    algorithm.stop()
+
+    restored = Algorithm.from_checkpoint(path)
+    state = restored.get_policy().model.state_dict()
+    assert all((state[name].numpy() == value).all() for name, value in weights.items())
+    restored.stop()
+
+    resumed = config.build()
+    resumed.restore(path)
+    state = resumed.learner_group.get_weights()[DEFAULT_POLICY_ID]
+    assert all((state[name] == value).all() for name, value in weights.items())
+    resumed.stop()
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("ray.rllib")
+
+from ray.rllib.algorithms.ppo import PPOConfig
+from ray.rllib.policy.sample_batch import SampleBatch
+
+from game import Game
+from inference_server import InferenceServer, run
+from policies import play
+
+ENV_CONFIG = {'render_mode': None}
+
+
+class ModulePolicy:
+    """Greedy actions of the algorithm's own module, in this process."""
+
+    def __init__(self, module):
+        self.module = module
+
+    def act(self, game, observation):
+        import torch
+        with torch.no_grad():
+            output = self.module.forward_inference({SampleBatch.OBS: torch.from_numpy(observation[None])})
+        return int(output[SampleBatch.ACTION_DIST_INPUTS].argmax(dim=-1)[0])
+
+
+def test_serves_a_saved_module(tmp_path):
+    config = (
+        PPOConfig()
+        .experimental(_enable_new_api_stack=True, _disable_preprocessor_api=True)
+        .framework("torch")
+        .rollouts(num_rollout_workers=0)
+        .environment(Game, env_config=ENV_CONFIG)
+        .training(model={"fcnet_hiddens": [32, 32]})
+    )
+    algorithm = config.build()
+    # Random weights large enough that the greedy actions vary.
+    rng = np.random.default_rng(0)
+    weights = {module_id: {name: rng.normal(scale=1.0, size=value.shape).astype(value.dtype)
+                           for name, value in module_weights.items()}
+               for module_id, module_weights in algorithm.learner_group.get_weights().items()}
+    algorithm.learner_group.set_weights(weights)
+    algorithm.workers.sync_weights(from_worker_or_learner_group=algorithm.learner_group)
+    checkpoint = str(tmp_path / "checkpoint-000001")
+    algorithm.save(checkpoint_dir=checkpoint)
+
+    game = Game(ENV_CONFIG)
+    server = InferenceServer(checkpoint, game.observation_space, 2).start()
+    served = run(server, 'Game', ENV_CONFIG, 4, seed=3, max_steps=100)
+    server.close()
+
+    expected = play(ModulePolicy(algorithm.get_policy().model), game, [(3 + i, 0) for i in range(4)], 100)
+    algorithm.stop()
+    assert served == expected
+    assert len({summary['return'] for summary in served}) > 1
+    assert server.stats()['requests'] == sum(summary['length'] for summary in served)
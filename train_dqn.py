@@ -16,6 +16,8 @@ import matplotlib.pyplot as plt
 from game import Game
 from game_lookback import Game2D
 from game_lookback_flat import Game2DFlat
+from checkpoint_writer import CheckpointWriter, report_checkpoints
+from metrics_store import MetricsStore
 
 import os
 from datetime import datetime, timedelta
@@ -110,12 +112,6 @@ def train_model(env, episodes=1000, print_every=10, ckpt="", model_type="fcnet")
         end_idx = ckpt.index('/checkpoint')
         version = int(ckpt[start_idx:end_idx])
         path = os.path.join(os.getcwd(), f"Results/{name}_v{version}/")
-        with open(path + 'rewards.txt', 'r') as f:
-            episode_reward_means = [float(x) for x in f.read().split(",") if x]
-            max_reward = max(episode_reward_means)
-            idx_max = episode_reward_means.index(max_reward)
-            episode_reward_means = episode_reward_means[:idx_max+1]
-            print("Ckpt highest mean reward:", max_reward)
     else:
         start_episode = 1
         version = sum(name in filename for filename in os.listdir("Results/")) + 1
@@ -123,13 +119,22 @@ def train_model(env, episodes=1000, print_every=10, ckpt="", model_type="fcnet")
 
     if not os.path.exists(path):
         os.mkdir(path)
+    store = MetricsStore(path)
+    if ckpt:
+        store.import_rewards_txt()
+        # Results after the checkpoint are superseded as training goes on.
+        metrics = store.load()
+        iterations = metrics.column('iteration').to_numpy()
+        rewards = metrics.column('episode_reward_mean').to_numpy()
+        episode_reward_means = rewards[iterations < start_episode].tolist()
+        max_reward = max(episode_reward_means)
+        print("Ckpt highest mean reward:", max_reward)
+    writer = CheckpointWriter(path, store=store)
 
     for i in range(start_episode, episodes+start_episode):
         result = module.train()
         episode_reward_means.append(result['episode_reward_mean'])
-        with open(path+"rewards.txt", 'a') as f:
-            f.write(str(result['episode_reward_mean']))
-            f.write(",")
+        store.append(i, result)
 
         if i == start_episode:
             pprint(result)
@@ -155,20 +160,16 @@ def train_model(env, episodes=1000, print_every=10, ckpt="", model_type="fcnet")
             print(f'  Total runtime : {d1}d {h1}h {m1}m {s1}s')
             print(f'  Expected end  : {d2}d {h2}h {m2}m {s2}s')
         if result['episode_reward_mean'] > max_reward:
-            if not os.path.exists(path):
-                os.mkdir(path)
-
             max_reward = result['episode_reward_mean']
-            prefix = '0' * (6-len(str(i)))
-            result = module.save(checkpoint_dir=os.path.join(path, f"checkpoint-{prefix}{i}"))
-            save_path = result.checkpoint.path
-            print(f"\nCkpt saved    : {save_path}")
-            print(f"Mean reward     : {round(max_reward,4)}")
+            # Saved now, published in the background (see
+            # checkpoint_writer.py).
+            writer.save(i, max_reward, lambda checkpoint_dir: module.save(checkpoint_dir=checkpoint_dir))
+        save_path = report_checkpoints(writer.index(store), save_path)
 
+    writer.close()
+    save_path = report_checkpoints(writer.index(store), save_path)
     module.stop()
-    with open(path + 'rewards.txt', 'w') as f:
-        for value in episode_reward_means:
-            f.write(str(value)+',')
+    store.close()
 
     return episode_reward_means, save_path
 
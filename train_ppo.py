@@ -10,6 +10,8 @@ import matplotlib.pyplot as plt
 from game import Game
 from game_lookback import Game2D
 from game_lookback_flat import Game2DFlat
+from checkpoint_writer import CheckpointWriter, report_checkpoints
+from metrics_store import MetricsStore
 
 import os
 from datetime import datetime, timedelta
@@ -96,12 +98,6 @@ def train_model(env, episodes=1000, print_every=10, save_every=1000, ckpt=""):
         end_idx = ckpt.index('/checkpoint')
         version = int(ckpt[start_idx:end_idx])
         result_path = os.path.join(os.getcwd(), f"Results/{name}_v{version}/")
-        with open(result_path + 'rewards.txt', 'r') as f:
-            episode_reward_means = [float(x) for x in f.read().split(",") if x]
-            max_reward = max(episode_reward_means)
-            idx_max = episode_reward_means.index(max_reward)
-            episode_reward_means = episode_reward_means[:idx_max+1]
-            print("Ckpt highest mean reward:", max_reward)
     else:
         start_episode = 1
         version = sum(name in filename for filename in os.listdir("Results/")) + 1
@@ -109,14 +105,23 @@ def train_model(env, episodes=1000, print_every=10, save_every=1000, ckpt=""):
 
     if not os.path.exists(result_path):
         os.mkdir(result_path)
+    store = MetricsStore(result_path)
+    if ckpt:
+        store.import_rewards_txt()
+        # Results after the checkpoint are superseded as training goes on.
+        metrics = store.load()
+        iterations = metrics.column('iteration').to_numpy()
+        rewards = metrics.column('episode_reward_mean').to_numpy()
+        episode_reward_means = rewards[iterations < start_episode].tolist()
+        max_reward = max(episode_reward_means)
+        print("Ckpt highest mean reward:", max_reward)
+    writer = CheckpointWriter(result_path, store=store)
 
     for i in range(start_episode, episodes+start_episode):
         result = module.train()
         episode_reward_means.append(result['episode_reward_mean'])
         curr_iter_times[i % print_every] = result['time_this_iter_s']
-        with open(result_path+"rewards.txt", 'a') as f:
-            f.write(str(result['episode_reward_mean']))
-            f.write(",")
+        store.append(i, result)
 
         if i == start_episode:
             pprint(result)
@@ -140,26 +145,21 @@ def train_model(env, episodes=1000, print_every=10, save_every=1000, ckpt=""):
             print(f'  Iter runtime  :', round(curr_iter_time, 4))
             print(f'  Total runtime : {d1}d {h1}h {m1}m {s1}s')
             print(f'  Expected end  : {d2}d {h2}h {m2}m {s2}s')
-        if result['episode_reward_mean'] > max_reward:
-            if not os.path.exists(result_path):
-                os.mkdir(result_path)
-
+        # Checkpoints are saved now and published in the background; a
+        # periodic one is only flagged best if the iteration is also a new
+        # best.
+        best = result['episode_reward_mean'] > max_reward
+        if best:
             max_reward = result['episode_reward_mean']
-            prefix = '0' * (6-len(str(i)))
-            result = module.save(checkpoint_dir=os.path.join(result_path, f"checkpoint-{prefix}{i}"))
-            save_path = result.checkpoint.path
-            print(f"\nCkpt saved: {save_path}")
-            print(f"Mean reward : {round(max_reward,4)}")
-        if i % save_every == 0:
-            prefix = '0' * (6-len(str(i)))
-            result = module.save(checkpoint_dir=os.path.join(result_path, f"checkpoint-{prefix}{i}"))
-            save_path = result.checkpoint.path
-            print(f"\nCkpt (not best) saved: {save_path}")
+        if best or i % save_every == 0:
+            writer.save(i, result['episode_reward_mean'],
+                        lambda path: module.save(checkpoint_dir=path), best=best)
+        save_path = report_checkpoints(writer.index(store), save_path)
 
+    writer.close()
+    save_path = report_checkpoints(writer.index(store), save_path)
     module.stop()
-    with open(result_path + 'rewards.txt', 'w') as f:
-        for value in episode_reward_means:
-            f.write(str(value)+',')
+    store.close()
 
     return episode_reward_means, save_path
 
@@ -0,0 +1,309 @@
+"""
+Per-class ball trajectory tables.
+
+Between two wall hits a ball's x moves by the same step every frame, and
+between two floor bounces its y follows the same sequence of moves, which
+only depends on the ball's class, timestep and the display size (after a
+bounce, the ball always leaves the floor at -max_yspeed; before its first
+one, it always starts from rest). Each sequence is tabulated once, so a
+ball's state is the float position at its last event (spawn, wall hit or
+bounce) and the number of frames since, and its position any number of
+frames later is a table lookup.
+"""
+import numpy as np
+
+from physics import ball_tables, ball_xspeed, laser_collides
+
+# Tables shared by every game in the process, keyed by display size.
+_TRAJECTORIES = {}
+
+
+def horizontal_table(step, width):
+    """Offsets of a ball's x, moving `step` a frame, until it has crossed the display."""
+    offsets = [0.0]
+    while offsets[-1] <= width + step:
+        offsets.append(offsets[-1] + step)
+
+    return np.array(offsets)
+
+
+def vertical_table(speed, max_yspeed, yacc, timestep, height):
+    """
+    Offsets and speeds of a ball's y, starting with the given speed, until it
+    has fallen further than the display's height. Moves and speeds are
+    computed as the frame-by-frame update computed them.
+    """
+    drift = 0.5 * yacc * timestep ** 2
+    offsets = [0.0]
+    speeds = [speed]
+    while offsets[-1] <= height + max_yspeed * timestep:
+        offsets.append(offsets[-1] + (speeds[-1] * timestep + drift))
+        speeds.append(min(max(speeds[-1] + yacc * timestep, -max_yspeed), max_yspeed))
+
+    return np.array(offsets), np.array(speeds)
+
+
+def _pad(table, length):
+    """Extend a table to length frames by repeating its last step."""
+    extra = length - len(table)
+    if extra <= 0:
+        return table
+
+    return np.concatenate((table, table[-1] + (table[-1] - table[-2]) * np.arange(1, extra + 1)))
+
+
+class Trajectories:
+    """
+    Trajectory tables of every (ball level, timestep) pair in use, stacked
+    into 2D arrays so that every ball looks up its row by a table id. Rows
+    are indexed by the number of frames since the ball's last event:
+
+    - x: x offsets (moving right) since the last spawn or wall hit;
+    - rest_y, rest_yspeed: y offsets and speeds since spawning at rest;
+    - bounce_y, bounce_yspeed: the same since the last floor bounce.
+
+    Table ids depend on the order pairs are first used in, so they are only
+    meaningful within a process.
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.radius, self.max_yspeed, self.yacc = ball_tables(width, height)
+        self.xspeed = ball_xspeed(width)
+        self.ids = {}
+        self.rows = []
+        self.length = 1
+        self.x = self.rest_y = self.rest_yspeed = self.bounce_y = self.bounce_yspeed = np.zeros((0, 1))
+
+    def id(self, level, timestep):
+        """Table id of balls of the given level and timestep."""
+        key = (int(level), float(timestep))
+        table = self.ids.get(key)
+        if table is None:
+            table = self.ids[key] = self._add(*key)
+
+        return table
+
+    def lookup(self, level, timestep):
+        """Vectorized id, giving 0 where level is 0 (an empty slot)."""
+        level = np.asarray(level)
+        timestep = np.asarray(timestep)
+        tables = np.zeros(level.shape, dtype=np.int16)
+        for key in set(zip(level[level > 0].tolist(), timestep[level > 0].tolist())):
+            tables[(level == key[0]) & (timestep == key[1])] = self.id(*key)
+
+        return tables
+
+    def _add(self, level, timestep):
+        max_yspeed, yacc = self.max_yspeed[level], self.yacc[level]
+        start = min(max(-max_yspeed + yacc * timestep, -max_yspeed), max_yspeed)
+        self.rows.append((horizontal_table(self.xspeed * timestep, self.width),
+                          *vertical_table(0.0, max_yspeed, yacc, timestep, self.height),
+                          *vertical_table(start, max_yspeed, yacc, timestep, self.height)))
+        self.length = max(self.length, max(len(table) for row in self.rows for table in row))
+        self.x, self.rest_y, self.rest_yspeed, self.bounce_y, self.bounce_yspeed = (
+            np.stack([_pad(row[i], self.length) for row in self.rows]) for i in range(5))
+        return len(self.rows) - 1
+
+
+def trajectories(width, height):
+    """The process-wide Trajectories of a display size."""
+    tables = _TRAJECTORIES.get((width, height))
+    if tables is None:
+        tables = _TRAJECTORIES[(width, height)] = Trajectories(width, height)
+
+    return tables
+
+
+def step_balls(tables, active, table, x0, x_phase, y0, y_phase, bounced,
+               x, y, rect_x, rect_y, xspeed, yspeed, radius, width, height):
+    """
+    Advance every ball by one frame in place.
+
+    All arguments but tables, width and height are arrays of the same shape.
+    The rect bounces off the walls and the floor: the speed flips and the
+    rect is mirrored (or put back on the floor) for that frame, while the
+    float position carries on from where it went past, starting a new
+    segment of the tables. Balls that hit the ceiling are deactivated
+    without splitting.
+    """
+    last = tables.length - 1
+    x_phase += 1
+    np.minimum(x_phase, last, out=x_phase)
+    np.add(x0, np.sign(xspeed) * tables.x[table, x_phase], out=x)
+    np.rint(x, out=rect_x)
+
+    diameter = 2 * radius
+    left = rect_x < 0
+    right = rect_x + diameter > width
+    wall = left | right
+    np.negative(xspeed, out=xspeed, where=wall)
+    np.negative(rect_x, out=rect_x, where=left)
+    np.subtract(2 * width - 2 * diameter, rect_x, out=rect_x, where=right)
+    np.copyto(x0, x, where=wall)
+    x_phase[wall] = 0
+
+    y_phase += 1
+    np.minimum(y_phase, last, out=y_phase)
+    np.add(y0, np.where(bounced, tables.bounce_y[table, y_phase], tables.rest_y[table, y_phase]), out=y)
+    np.rint(y, out=rect_y)
+
+    active &= rect_y >= 0
+
+    floor = rect_y + diameter > height
+    np.subtract(height, diameter, out=rect_y, where=floor)
+    np.copyto(y0, y, where=floor)
+    y_phase[floor] = 0
+    bounced |= floor
+    np.copyto(yspeed, np.where(bounced, tables.bounce_yspeed[table, y_phase],
+                               tables.rest_yspeed[table, y_phase]), where=active)
+
+
+def x_paths(tables, table, x0, phase, xspeed, diameter, width, frames):
+    """
+    Rect x of every ball over the next `frames` frames, as step_balls would
+    produce them, without stepping frame by frame. Arguments are 1D arrays
+    (but tables, width and frames).
+
+    Each segment between wall hits is looked up in one pass; every wall hit
+    starts a new one, for the balls that hit a wall only.
+
+    :return: A tuple (rect_x, x0, phase, xspeed) of the rects, with shape
+             (balls, frames), and each ball's segment state after them.
+    """
+    count = len(x0)
+    rect_x = np.empty((count, frames))
+    x0, phase, xspeed = x0.astype(float), phase.astype(int), xspeed.astype(float)
+    start = np.zeros(count, dtype=int)
+    index = np.arange(frames)
+    pending = np.arange(count)
+    while len(pending):
+        balls = pending
+        offset = index - start[balls, None] + 1
+        valid = offset >= 1
+        rows = np.clip(phase[balls, None] + offset, 0, tables.length - 1)
+        x = x0[balls, None] + np.sign(xspeed[balls, None]) * tables.x[table[balls, None], rows]
+        rounded = np.rint(x)
+        width_left = 2 * width - 2 * diameter[balls, None]
+        left = rounded < 0
+        right = rounded + diameter[balls, None] > width
+        end = first_true(valid & (left | right))
+        mirrored = np.where(left, -rounded, np.where(right, width_left - rounded, rounded))
+        rect_x[balls] = np.where(valid & (index <= end[:, None]), mirrored, rect_x[balls])
+
+        hit = end < frames
+        done = balls[~hit]
+        phase[done] += frames - start[done]
+        pending = balls[hit]
+        end = end[hit]
+        x0[pending] = x[hit, end]
+        xspeed[pending] = -xspeed[pending]
+        phase[pending] = 0
+        start[pending] = end + 1
+
+    return rect_x, x0, phase, xspeed
+
+
+def y_paths(tables, table, y0, phase, bounced, diameter, height, frames):
+    """
+    Rect y of every ball over the next `frames` frames, as step_balls would
+    produce them, without stepping frame by frame. Arguments are 1D arrays
+    (but tables, height and frames).
+
+    :return: A tuple (rect_y, y0, phase, bounced, ceiling) of the rects, with
+             shape (balls, frames), each ball's segment state after them, and
+             the frame each ball hits the ceiling on (frames if it does not).
+             Rects from that frame on are meaningless.
+    """
+    count = len(y0)
+    rect_y = np.empty((count, frames))
+    y0, phase, bounced = y0.astype(float), phase.astype(int), bounced.astype(bool)
+    ceiling = np.full(count, frames)
+    start = np.zeros(count, dtype=int)
+    index = np.arange(frames)
+    pending = np.arange(count)
+    while len(pending):
+        balls = pending
+        offset = index - start[balls, None] + 1
+        valid = offset >= 1
+        rows = np.clip(phase[balls, None] + offset, 0, tables.length - 1)
+        y = y0[balls, None] + np.where(bounced[balls, None], tables.bounce_y[table[balls, None], rows],
+                                       tables.rest_y[table[balls, None], rows])
+        rounded = np.rint(y)
+        top = rounded < 0
+        floor = rounded + diameter[balls, None] > height
+        end = first_true(valid & (top | floor))
+        rect_y[balls] = np.where(valid & (index <= end[:, None]),
+                                 np.where(floor, height - diameter[balls, None], rounded),
+                                 rect_y[balls])
+
+        hit = end < frames
+        done = balls[~hit]
+        phase[done] += frames - start[done]
+        last = np.minimum(end, frames - 1)
+        popped = hit & top[np.arange(len(balls)), last]
+        ceiling[balls[popped]] = end[popped]
+        bounce = hit & ~popped
+        pending = balls[bounce]
+        end = end[bounce]
+        y0[pending] = y[bounce, end]
+        bounced[pending] = True
+        phase[pending] = 0
+        start[pending] = end + 1
+
+    return rect_y, y0, phase, bounced, ceiling
+
+
+def first_true(mask):
+    """Index of the first True along the last axis, or its length if none."""
+    return np.where(mask.any(axis=-1), np.argmax(mask, axis=-1), mask.shape[-1])
+
+
+def predict_laser_hits(tables, laser_active, laser_x, laser_length, fire_x,
+                       ball_active, table, x, y, radius, laser_speed,
+                       agent_height, width, height):
+    """
+    Predict whether each laser will hit a ball before it tops out, if it is
+    fired now from fire_x (or keeps going, if it is already active).
+
+    Laser arrays have shape (n,) and ball arrays shape (n, capacity). As the
+    ball copies this used to step did, every ball is predicted to restart
+    from rest at its float position, moving right. The laser's length and
+    the balls' rects are solved for every frame of the laser's remaining
+    lifetime at once and tested for overlap; balls that would reach the
+    ceiling cannot be hit from then on.
+
+    :return: A boolean array of shape (n,).
+    """
+    length = np.where(laser_active, laser_length, agent_height)
+    x_laser = np.where(laser_active, laser_x, fire_x)
+    frames = max(int(np.ceil((height - length.min()) / laser_speed)) + 1, 1)
+    lengths = np.empty(length.shape + (frames + 1,))
+    lengths[..., 0] = length
+    lengths[..., 1:] = laser_speed
+    np.add.accumulate(lengths, axis=-1, out=lengths)
+    # The laser is still active on a frame if it had not topped out before it.
+    alive = lengths[..., :-1] < height
+    lengths = np.minimum(lengths[..., 1:], height)
+
+    # Only the balls in play are solved for.
+    envs, slots = np.nonzero(ball_active)
+    if len(envs) == 0:
+        return np.zeros(len(length), dtype=bool)
+
+    table = table[envs, slots]
+    radius = radius[envs, slots]
+    diameter = 2 * radius
+    zeros = np.zeros(len(envs), dtype=int)
+    rect_x = x_paths(tables, table, x[envs, slots], zeros, np.ones(len(envs)),
+                     diameter, width, frames)[0]
+    rect_y, _, _, _, ceiling = y_paths(tables, table, y[envs, slots], zeros,
+                                       zeros.astype(bool), diameter, height, frames)
+    in_play = np.arange(frames) < ceiling[:, None]
+    hits = laser_collides(alive[envs], x_laser[envs, None], lengths[envs], in_play,
+                          rect_x + radius[:, None], rect_y + radius[:, None],
+                          radius[:, None], height)
+    predicted = np.zeros(len(length), dtype=bool)
+    predicted[envs[hits.any(axis=-1)]] = True
+    return predicted
@@ -0,0 +1,297 @@
+import gymnasium as gym
+from gymnasium import spaces
+import numpy as np
+
+from game import observation_size, reward_weights
+from physics import (AGENT_COLLISIONS, agent_hitboxes, agent_size, agent_speed, ball_tables,
+                     ball_xspeed, laser_collides, round_half_away, step_agents, update_lasers)
+from levels import Levels
+from rasterizer import Rasterizer
+from trajectory import predict_laser_hits, step_balls, trajectories
+
+
+class VectorGame(gym.vector.VectorEnv):
+    """
+    Many copies of Game stepped together with NumPy.
+
+    Instead of sprites, the state of every environment lives in flat arrays:
+    one row per environment and, for balls, one column per slot up to
+    `capacity`. Each step advances all environments at once with the kernels
+    in physics.py and trajectory.py. Environments that terminate or are
+    truncated (level cleared) are reset automatically; the observation they
+    ended on is returned in info["final_observation"]. Unlike Game, the
+    laser_sim reward of the step that clears a level is computed on the
+    cleared level.
+    """
+
+    def __init__(self, config):
+        self.name = "Vector"
+        self.fps = config.get('fps', 60)
+        self.width = config.get('width', 720)
+        self.height = round(self.width / 1.87)
+        self.capacity = config.get('capacity', 40)
+
+        # Agent-vs-ball test: 'rect' or 'capsule' (see physics.AGENT_COLLISIONS).
+        self.agent_collides = AGENT_COLLISIONS[config.get('collision', 'rect')]
+        # Observed ball slots, as in Game.
+        self.max_balls = config.get('max_balls', 16)
+        self.ball_mask = config.get('ball_mask', False)
+        self.rewards = reward_weights(config)
+        self.rng = np.random.default_rng(config.get('seed'))
+        # Random levels, drawn from the same bank as Game's.
+        self.bank = Levels(self.width, self.height, self.fps, config.get('level_bank_size', 4096),
+                           config.get('level_seed', 0)).random
+        if self.capacity < self.bank.max_balls():
+            raise ValueError(f"capacity must be at least {self.bank.max_balls()}, the most balls a "
+                             f"level of the bank can have in play.")
+        # 'vector' or 'pixels', as in Game.
+        self.obs_type = config.get('obs_type', 'vector')
+        self.rasterizer = None
+        if self.obs_type == 'pixels':
+            self.rasterizer = Rasterizer(self.width, self.height,
+                                         config.get('pixel_resolution', (120, 64)),
+                                         config.get('pixel_channels', 3))
+            observation_space = spaces.Box(low=0, high=255, shape=self.rasterizer.shape, dtype=np.uint8)
+        elif self.obs_type == 'vector':
+            size = observation_size(self.max_balls, self.ball_mask)
+            observation_space = spaces.Box(low=-1.0, high=1.0, shape=(size,))
+        else:
+            raise ValueError(f"Unknown observation type: {self.obs_type}")
+
+        super().__init__(config.get('num_envs', 8), observation_space, spaces.Discrete(4))
+
+        n, c = self.num_envs, self.capacity
+        self.radius_table = ball_tables(self.width, self.height)[0]
+        self.xspeed = ball_xspeed(self.width)
+        self.trajectories = trajectories(self.width, self.height)
+        self.agent_width, self.agent_height = agent_size(self.width)
+        self.agent_y = self.height - self.agent_height
+        self.hitbox_x, self.hitbox_y, self.hitbox_width, self.hitbox_height = agent_hitboxes(self.width)
+        self.agent_speed = agent_speed(self.width, self.fps)
+        self.laser_speed = self.height / self.fps
+
+        # Ball slots
+        self.active = np.zeros((n, c), dtype=bool)
+        self.level = np.zeros((n, c), dtype=np.int8)
+        self.order = np.zeros((n, c), dtype=np.int64)
+        self.x = np.zeros((n, c))
+        self.y = np.zeros((n, c))
+        self.rect_x = np.zeros((n, c))
+        self.rect_y = np.zeros((n, c))
+        self.ball_xspeed = np.zeros((n, c))
+        self.ball_yspeed = np.zeros((n, c))
+        self.radius = np.zeros((n, c))
+        self.timestep = np.zeros((n, c))
+        # Trajectory segments, as in BallStore.
+        self.table = np.zeros((n, c), dtype=np.int16)
+        self.x0 = np.zeros((n, c))
+        self.x_phase = np.zeros((n, c), dtype=np.int64)
+        self.y0 = np.zeros((n, c))
+        self.y_phase = np.zeros((n, c), dtype=np.int64)
+        self.bounced = np.zeros((n, c), dtype=bool)
+        self.next_order = np.zeros(n, dtype=np.int64)
+
+        # Agents and lasers
+        self.agent_x = np.zeros(n)
+        self.laser_active = np.zeros(n, dtype=bool)
+        self.laser_x = np.zeros(n)
+        self.laser_length = np.zeros(n)
+
+        if self.rasterizer is not None:
+            self.observations = self.rasterizer.frames(n)
+        else:
+            self.observations = np.zeros((n, size), dtype=np.float32)
+        self._actions = np.full(n, 3)
+        # Action of each agent's last step, which selects its sprite.
+        self.last_actions = np.full(n, 3)
+        self._rows = np.arange(n)
+
+    def reset_wait(self, seed=None, options=None):
+        if seed is not None:
+            self.rng = np.random.default_rng(seed)
+
+        self._reset_envs(self._rows)
+        self._get_obs(self._rows, self.observations)
+        return self.observations.copy(), {}
+
+    def step_async(self, actions):
+        self._actions = np.asarray(actions)
+
+    def step_wait(self):
+        actions = self._actions
+        self.last_actions[:] = actions
+        step_agents(self.agent_x, self.laser_active, self.laser_x,
+                    actions == 0, actions == 1, actions == 2,
+                    self.agent_speed, self.agent_width, self.width)
+        update_lasers(self.laser_active, self.laser_length, self.laser_speed,
+                      self.agent_height, self.height)
+        step_balls(self.trajectories, self.active, self.table, self.x0, self.x_phase,
+                   self.y0, self.y_phase, self.bounced, self.x, self.y, self.rect_x,
+                   self.rect_y, self.ball_xspeed, self.ball_yspeed, self.radius,
+                   self.width, self.height)
+
+        center_x = self.rect_x + self.radius
+        center_y = self.rect_y + self.radius
+        hits = laser_collides(self.laser_active[:, None], self.laser_x[:, None],
+                              self.laser_length[:, None], self.active,
+                              center_x, center_y, self.radius, self.height)
+        touching = self.agent_collides((self.agent_x + self.hitbox_x[actions])[:, None],
+                                       self.agent_y + self.hitbox_y[actions][:, None],
+                                       self.hitbox_width[actions][:, None],
+                                       self.hitbox_height[actions][:, None],
+                                       self.active, center_x, center_y, self.radius)
+
+        # A laser pops at most one ball per step: the first one in sprite
+        # order. Every other ball touching the agent ends the game.
+        hit_envs = np.flatnonzero(hits.any(axis=1))
+        hit_slots = np.argmin(np.where(hits, self.order, np.iinfo(np.int64).max)[hit_envs], axis=1)
+        touching[hit_envs, hit_slots] = False
+        split = self._pop(hit_envs, hit_slots)
+
+        rewards = np.zeros(self.num_envs)
+        rewards[hit_envs] += np.where(split, self.rewards['hit_ball'], self.rewards['pop_ball'])
+        game_overs = touching.sum(axis=1)
+        rewards += game_overs * self.rewards['game_over']
+        terminated = game_overs > 0
+        truncated = np.zeros(self.num_envs, dtype=bool)
+        truncated[hit_envs] = ~self.active[hit_envs].any(axis=1)
+        rewards[truncated] += self.rewards['finish_level']
+
+        # Shaping terms, as in Game, only computed when weighted.
+        agent_center = self.agent_x + self.agent_width // 2
+        if self.rewards['laser_sim']:
+            laser_sim = predict_laser_hits(self.trajectories, self.laser_active, self.laser_x,
+                                           self.laser_length, agent_center, self.active,
+                                           self.table, self.x, self.y, self.radius,
+                                           self.laser_speed, self.agent_height,
+                                           self.width, self.height)
+            rewards += np.where(laser_sim == (actions == 2), 1, -1) * self.rewards['laser_sim']
+
+        middle = self.width / 2
+        rewards[(agent_center < middle - 100) | (agent_center > middle + 100)] += self.rewards['off_center']
+
+        self._get_obs(self._rows, self.observations)
+        infos = {}
+        done = np.flatnonzero(terminated | truncated)
+        if len(done):
+            infos['final_observation'] = self.observations.copy()
+            infos['_final_observation'] = terminated | truncated
+            self._reset_envs(done)
+            self._get_obs(done, self.observations)
+
+        return self.observations.copy(), rewards, terminated, truncated, infos
+
+    def _pop(self, envs, slots):
+        """
+        Remove the given balls and, like BallStore.pop, replace each one above
+        level 1 with two balls of the level below moving apart.
+
+        :return: A boolean array, True where the popped ball was split.
+        """
+        self.laser_active[envs] = False
+        self.laser_length[envs] = self.agent_height
+        self.active[envs, slots] = False
+        parents = self.level[envs, slots]
+        split = parents > 1
+        envs, slots, levels = envs[split], slots[split], parents[split] - 1
+        x, y = self.rect_x[envs, slots], self.rect_y[envs, slots]
+        timestep = self.timestep[envs, slots]
+        for xspeed in (-self.xspeed, self.xspeed):
+            free = ~self.active[envs]
+            child = np.argmax(free, axis=1)
+            if not free[np.arange(len(envs)), child].all():
+                raise RuntimeError("A split ball does not fit in the environment's capacity.")
+            self._place(envs, child, levels, x, y, xspeed, timestep)
+
+        return split
+
+    def _place(self, envs, slots, levels, x, y, xspeed, timestep):
+        self.active[envs, slots] = True
+        self.level[envs, slots] = levels
+        self.order[envs, slots] = self.next_order[envs]
+        self.next_order[envs] += 1
+        self.x[envs, slots] = x
+        self.y[envs, slots] = y
+        self.rect_x[envs, slots] = np.trunc(x)
+        self.rect_y[envs, slots] = np.trunc(y)
+        self.ball_xspeed[envs, slots] = xspeed
+        self.ball_yspeed[envs, slots] = 0.0
+        self.radius[envs, slots] = self.radius_table[levels]
+        self.timestep[envs, slots] = timestep
+        self.table[envs, slots] = self.trajectories.lookup(levels, np.broadcast_to(timestep, np.shape(levels)))
+        self.x0[envs, slots] = x
+        self.x_phase[envs, slots] = 0
+        self.y0[envs, slots] = y
+        self.y_phase[envs, slots] = 0
+        self.bounced[envs, slots] = False
+
+    def _reset_envs(self, envs):
+        self.agent_x[envs] = round_half_away(self.width / 2) - self.agent_width // 2
+        self.last_actions[envs] = 3
+        self.laser_active[envs] = False
+        self.laser_length[envs] = self.agent_height
+        self.active[envs] = False
+        self.ball_xspeed[envs] = 0.0
+        self.ball_yspeed[envs] = 0.0
+        self.next_order[envs] = 0
+        self._randomize(envs)
+
+    def _randomize(self, envs):
+        """Load a random level from the bank into each of the given environments."""
+        index, slots, rows = self.bank.rows(self.rng.integers(len(self.bank), size=len(envs)))
+        self._place(envs[index], slots, self.bank.level[rows], self.bank.x[rows],
+                    self.bank.y[rows], self.xspeed, self.bank.timestep[rows])
+
+    def _get_obs(self, envs, out):
+        """
+        Write the Game observation of the given environments into out. Like
+        Game._get_obs, fewer than max_balls balls are padded by repeating them
+        in order (or zeroed and flagged invalid with ball_mask); beyond
+        max_balls, the oldest balls are kept.
+        """
+        if self.rasterizer is not None:
+            self._get_pixels(envs, out)
+            return
+
+        m = self.max_balls
+        active = self.active[envs]
+        key = np.where(active, self.order[envs], np.iinfo(np.int64).max)
+        ordered = np.argsort(key, axis=1, kind='stable')
+        count = np.minimum(active.sum(axis=1), m)[:, None]
+        index = np.arange(m)
+        if self.ball_mask:
+            valid = index < count
+            index = np.minimum(index, ordered.shape[1] - 1)
+        else:
+            valid = count > 0
+            index = index % np.maximum(count, 1)
+
+        slots = ordered[np.arange(len(envs))[:, None], index]
+        rows = envs[:, None]
+        radius = self.radius[rows, slots]
+        features = (
+            radius / min(self.width, self.height),
+            np.clip((self.rect_x[rows, slots] + radius) / self.width, 0, 1),
+            np.clip((self.rect_y[rows, slots] + radius) / self.height, 0, 1),
+            self.ball_xspeed[rows, slots] / self.width,
+            self.ball_yspeed[rows, slots] / self.height,
+        )
+        for i, feature in enumerate(features):
+            out[envs, i * m:(i + 1) * m] = np.where(valid, feature, 0.0)
+
+        out[envs, 5 * m] = self.laser_length[envs] / self.height
+        out[envs, 5 * m + 1] = (self.agent_x[envs] + self.agent_width // 2) / self.width
+        if self.ball_mask:
+            out[envs, 5 * m + 2:] = valid
+
+    def _get_pixels(self, envs, out):
+        """Draw the frames of the given environments into out."""
+        actions = self.last_actions[envs]
+        radius = self.radius[envs]
+        self.rasterizer.draw(out, envs, self.active[envs], self.level[envs],
+                             self.rect_x[envs] + radius, self.rect_y[envs] + radius, radius,
+                             (self.agent_x[envs] + self.hitbox_x[actions],
+                              self.agent_y + self.hitbox_y[actions],
+                              self.hitbox_width[actions], self.hitbox_height[actions]),
+                             self.laser_active[envs], self.laser_x[envs],
+                             self.laser_length[envs], int(self.width / 500.0))